@@ -1,7 +1,21 @@
+import functools
+import uuid
+
 import streamlit as st
-import pandas as pd
-import plotly.graph_objects as go
-from pathlib import Path
+
+import charts
+import exports
+import perf
+import warmup
+from config import FIRST_PAINT_BUDGET_MS, MAX_TIME_POINTS, MAX_TIME_POINTS_MOBILE, PERSONS
+from dataset import Filters, month_labels, normalize_name
+from figcache import SerializedFigure, figure_key, shared_cache
+from kpis import compute_kpis
+from refresher import shared_refresher
+
+# Datos y vista inicial en segundo plano desde el primer import del proceso
+# (ver warmup.py); no hace nada en las siguientes ejecuciones
+warmup.start()
 
 # ── CONFIGURACIÓN ─────────────────────────────────────────────────────────────
 st.set_page_config(
@@ -12,13 +26,17 @@ st.set_page_config(
 )
 
 # Inicializar session state
-if "selected_year_from_chart" not in st.session_state:
-    st.session_state.selected_year_from_chart = None
 if "current_tab" not in st.session_state:
     st.session_state.current_tab = "general"
+if "perf_session" not in st.session_state:
+    st.session_state.perf_session = uuid.uuid4().hex[:8]
+
+# Tiempos de esta ejecución por etapa, al log perf.jsonl (ver perf.py)
+run_trace = perf.begin("app", session=st.session_state.perf_session, tab=st.session_state.current_tab)
 
 # CSS personalizado
-st.markdown("""
+with perf.span("css"):
+    st.markdown("""
 <style>
     /* Ocultar sidebar toggle en mobile */
     @media (max-width: 768px) {
@@ -49,485 +67,436 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-PERSONS = ["ANGELS","ARANTXA","CRISTINA","Mª JOSÉ","MONTSERRAT","NURIA","SARA","VANESA","EMMA"]
-DUR_ORDER = ["30 m","1 h","1h30","2 h","2h30","3 h","4 h","8 h"]
-HORA_ORDER = ["7h","8h","9h","10h","11h","12h","13h","14h","15h","16h","17h"]
-PERSON_COLORS = {
-    "ANGELS":"#6366f1","ARANTXA":"#f59e0b","CRISTINA":"#10b981","Mª JOSÉ":"#3b82f6",
-    "MONTSERRAT":"#ec4899","NURIA":"#8b5cf6","SARA":"#14b8a6","VANESA":"#f97316","EMMA":"#64748b"
-}
-DUR_COLORS = ["#c7d2fe","#a5b4fc","#818cf8","#6366f1","#4f46e5","#4338ca","#3730a3","#312e81"]
-MESES = {"01":"Ene","02":"Feb","03":"Mar","04":"Abr","05":"May","06":"Jun",
-         "07":"Jul","08":"Ago","09":"Sep","10":"Oct","11":"Nov","12":"Dic"}
-
-EXCEL_PATH = Path(__file__).parent / "visitas_FROCA.xlsx"
+# ── HEADER ────────────────────────────────────────────────────────────────────
+# Antes de cargar los datos: es lo primero que ve quien llega tras un arranque
+st.markdown("# 📊 Dashboard de Visitas · FROCA")
 
 # ── CARGA DE DATOS ────────────────────────────────────────────────────────────
-@st.cache_data(ttl=300)
+@st.cache_resource(show_spinner="Cargando datos...")
+def get_refresher():
+    # Un único refresco en segundo plano por proceso: vigila el Excel y
+    # sustituye los datos sin bloquear a ninguna sesión (ver refresher.py).
+    # Si el precalentamiento ya está cargando, se espera a que termine.
+    perf.annotate(cache="miss")
+    return shared_refresher()
+
 def load_data():
     try:
-        df = pd.read_excel(EXCEL_PATH, sheet_name="Datos", usecols=[0,2,3,4,6,7], header=0)
-        df.columns = ["marca","persona","centro","fecha","hora","duracion"]
-        df = df.dropna(subset=["fecha","persona","centro"])
-        df["fecha"] = pd.to_datetime(df["fecha"], errors="coerce")
-        df = df.dropna(subset=["fecha"])
-        df["persona"] = df["persona"].astype(str).str.strip().str.upper()
-        df["centro"] = df["centro"].astype(str).str.strip().str.upper()
-        df["hora"] = df["hora"].astype(str).str.strip()
-        df["duracion"] = df["duracion"].astype(str).str.strip()
-        df["year"] = df["fecha"].dt.year.astype(str)
-        df["ym"] = df["fecha"].dt.strftime("%Y-%m")
-        df["mes_label"] = df["fecha"].dt.strftime("%m").map(MESES) + " " + df["fecha"].dt.strftime("%y")
-        df = df[df["persona"].isin(PERSONS)]
-        df = df[df["year"].isin(["2023","2024","2025","2026"])]
-        return df
+        return get_refresher().get()
     except Exception as e:
         st.error(f"Error cargando datos: {e}")
-        return pd.DataFrame()
+        return None
 
-df_all = load_data()
+with perf.span("load_data", cache="hit"):
+    dataset = load_data()
 
-if df_all.empty:
+if dataset is None or dataset.df.empty:
     st.error("No se pudieron cargar los datos del archivo Excel")
     st.stop()
 
-# ── HEADER ────────────────────────────────────────────────────────────────────
-st.markdown("# 📊 Dashboard de Visitas · FROCA")
+df_all = dataset.df
+cube = dataset.cube
+refresh_status = get_refresher().status
 
 # ── FILTROS HORIZONTALES (mobile-friendly) ────────────────────────────────────
-with st.container():
-    col_f1, col_f2, col_f3 = st.columns([1, 1, 1])
-    
-    with col_f1:
-        # Filtro año - sincronizado con gráfica interactiva
-        year_from_chart = st.session_state.selected_year_from_chart
-        year_opts = ["Todos"] + sorted(df_all["year"].unique())
-        
-        if year_from_chart and year_from_chart in year_opts:
-            default_idx = year_opts.index(year_from_chart)
-        else:
-            default_idx = 0
-        
-        year_sel = st.selectbox("📅 Año", year_opts, index=default_idx, key="year_filter_main")
-        
-        # Si el usuario cambia el selectbox manualmente, sincronizar
-        if year_sel != year_from_chart:
-            st.session_state.selected_year_from_chart = year_sel if year_sel != "Todos" else None
-    
-    with col_f2:
-        person_opts = ["Todas"] + PERSONS
-        person_sel = st.selectbox("👤 Consultora", person_opts, key="person_filter_main")
-    
-    with col_f3:
-        top_n = st.slider("Top N centros", 10, min(50, len(df_all["centro"].unique())), 20, 5, key="top_n_main")
+def toggle_year_from_chart():
+    # Callback del clic en "Visitas por Año". Se ejecuta antes del rerun,
+    # cuando aún se puede modificar el valor del filtro de año.
+    points = st.session_state.year_chart["selection"]["points"]
+    if points:
+        clicked = int(points[0]["x"])
+        years = st.session_state.year_filter_main
+        # Toggle: si ya estaba seleccionado, deseleccionar
+        st.session_state.year_filter_main = (
+            [y for y in years if y != clicked] if clicked in years else sorted(years + [clicked])
+        )
+        st.session_state.year_chart_clicked = True
+
+with perf.span("filters"):
+    with st.container():
+        col_f1, col_f2, col_f3 = st.columns([1, 1, 1])
+    
+        with col_f1:
+            # Filtro año - sincronizado con gráfica interactiva
+            year_opts = [int(y) for y in cube.labels("year")]
+            years_sel = st.multiselect("📅 Año", year_opts, key="year_filter_main", placeholder="Todos")
+    
+        with col_f2:
+            persons_sel = st.multiselect("👤 Consultora", PERSONS, key="person_filter_main", placeholder="Todas")
+    
+        with col_f3:
+            centros_sel = st.multiselect("🏫 Centro", list(cube.labels("centro")), key="centro_filter_main",
+                                         placeholder="Todos")
+    
+        with st.container():
+            ym_labels = cube.labels("ym")
+            month_opts = list(range(int(ym_labels.min()), int(ym_labels.max()) + 1))
+            if len(month_opts) > 1:
+                ym_from, ym_to = st.select_slider("🗓 Meses", month_opts, value=(month_opts[0], month_opts[-1]),
+                                                  format_func=lambda ym: month_labels(ym).item(),
+                                                  key="month_range_main")
+            else:
+                ym_from, ym_to = month_opts[0], month_opts[-1]
 
-st.caption(f"🗂 {len(df_all):,} registros · 📅 Hasta {df_all['fecha'].max().strftime('%b %Y')}")
+refresh_info = ""
+if refresh_status.last_refresh:
+    refresh_info = (f" · 🔄 Actualizado {refresh_status.last_refresh:%d/%m %H:%M}"
+                    f" ({refresh_status.last_duration:.1f} s)")
+st.caption(f"🗂 {len(df_all):,} registros · 📅 Hasta {dataset.last_date.strftime('%b %Y')}{refresh_info}")
+if refresh_status.last_error_at and refresh_status.last_error_at > refresh_status.last_refresh:
+    st.caption(f"⚠️ La última recarga falló ({refresh_status.last_error_at:%d/%m %H:%M}): "
+               f"{refresh_status.last_error} · Se muestran los datos anteriores")
 st.divider()
 
 # ── FILTRADO ──────────────────────────────────────────────────────────────────
-df = df_all.copy()
-if year_sel != "Todos":
-    df = df[df["year"] == year_sel]
-if person_sel != "Todas":
-    df = df[df["persona"] == person_sel]
+# Todo se calcula sobre el cubo de recuentos compartido (ver dataset.py): la
+# selección es un array de posiciones de filas obtenido intersecando índices
+# precalculados, sin copiar ni recorrer ninguna tabla
+filters = Filters(
+    years=tuple(years_sel),
+    personas=tuple(persons_sel),
+    centros=tuple(centros_sel),
+    ym_from=ym_from if ym_from != month_opts[0] else None,
+    ym_to=ym_to if ym_to != month_opts[-1] else None,
+)
 
-active_persons = [person_sel] if person_sel != "Todas" else PERSONS
 
-# ── KPIs ──────────────────────────────────────────────────────────────────────
-total_vis = len(df)
-meses_act = df.groupby("ym").size()
-media_mens = round(total_vis / len(meses_act[meses_act > 0])) if len(meses_act) > 0 else 0
+def show_chart(build, dataset, filters, *args, **kwargs):
+    # Figura serializada desde la caché LRU del proceso: clave (versión de
+    # datos, gráfica, filtros, parámetros). Solo se construye si no está.
+    key = figure_key(dataset, build, filters, *args)
+    with perf.span(f"chart:{build.__name__}"):
+        spec = shared_cache().get_or_build(key, lambda: build(dataset, filters, *args))
+        if spec is not None:
+            with perf.span("plotly_chart"):
+                return st.plotly_chart(SerializedFigure(spec), use_container_width=True, **kwargs)
 
-col1, col2 = st.columns(2)
-with col1:
-    st.metric("🔢 Total Visitas", f"{total_vis:,}".replace(",", "."))
-with col2:
-    st.metric("📈 Media Mensual", f"{media_mens} vis/mes")
 
-st.divider()
+def max_time_points():
+    # En el móvil caben menos barras: las series por mes se agrupan antes
+    # (trimestres/años, ver charts.py). Streamlit no da el ancho de pantalla.
+    return MAX_TIME_POINTS_MOBILE if "Mobi" in st.context.headers.get("User-Agent", "") else MAX_TIME_POINTS
 
-# ── NAVEGACIÓN CON BOTONES GRANDES ────────────────────────────────────────────
-nav_col1, nav_col2, nav_col3, nav_col4 = st.columns(4)
 
-with nav_col1:
-    if st.button("📊 Visión General", use_container_width=True, 
-                 type="primary" if st.session_state.current_tab == "general" else "secondary"):
-        st.session_state.current_tab = "general"
+def traced(fn):
+    # Etapa de la ejecución completa o, si el fragmento se relanza solo,
+    # traza propia en el log
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with perf.run(fn.__name__, session=st.session_state.perf_session,
+                      tab=st.session_state.current_tab):
+            return fn(*args, **kwargs)
+    return wrapper
 
-with nav_col2:
-    if st.button("🏫 Centros", use_container_width=True,
-                 type="primary" if st.session_state.current_tab == "centros" else "secondary"):
-        st.session_state.current_tab = "centros"
+# ── FRAGMENTOS ────────────────────────────────────────────────────────────────
+# KPIs, año interactivo y cada pestaña son fragmentos con sus dependencias
+# explícitas como argumentos (dataset, filtros). Cambiar de pestaña, mover el
+# Top N o pulsar dentro de una pestaña solo relanza ese fragmento; los filtros
+# de arriba y el clic en un año sí relanzan la app completa porque afectan a
+# todo lo demás.
 
-with nav_col3:
-    if st.button("📈 Evolución", use_container_width=True,
-                 type="primary" if st.session_state.current_tab == "evolucion" else "secondary"):
-        st.session_state.current_tab = "evolucion"
+@st.fragment
+@traced
+def kpi_strip(dataset, filters):
+    # Sumas acumuladas por mes precalculadas al cargar (ver kpis.py)
+    with perf.span("kpis"):
+        kpi = compute_kpis(dataset, filters)
+    yoy_delta = f"{kpi.yoy:+.0%} vs año anterior" if kpi.yoy is not None else None
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("🔢 Total Visitas", f"{kpi.total:,}".replace(",", "."), delta=yoy_delta)
+    with col2:
+        st.metric("📈 Media Mensual", f"{kpi.media_mensual} vis/mes")
+    
+    col3, col4 = st.columns(2)
+    with col3:
+        st.metric("📊 Media 3 meses", f"{kpi.media_3m:.0f} vis/mes" if kpi.media_3m is not None else "—",
+                  help="Media de los 3 meses que terminan en el último mes seleccionado")
+    with col4:
+        st.metric("📊 Media 12 meses", f"{kpi.media_12m:.0f} vis/mes" if kpi.media_12m is not None else "—",
+                  help="Media de los 12 meses que terminan en el último mes seleccionado")
 
-with nav_col4:
-    if st.button("⏱ Duración & Hora", use_container_width=True,
-                 type="primary" if st.session_state.current_tab == "duracion" else "secondary"):
-        st.session_state.current_tab = "duracion"
 
-st.divider()
+@st.fragment
+@traced
+def year_chart_fragment(dataset, filters):
+    # El clic cambia el filtro de año (ver toggle_year_from_chart), que afecta
+    # a KPIs y pestañas: en ese caso se relanza la app completa.
+    if st.session_state.pop("year_chart_clicked", False):
+        st.rerun()
+    
+    st.subheader("📅 Visitas por Año")
+    
+    # Mostrar gráfica con eventos de selección (el clic lo gestiona el callback)
+    show_chart(charts.year_chart, dataset, filters, on_select=toggle_year_from_chart, key="year_chart")
+    
+    st.caption("💡 Haz clic en una barra para filtrar ese año · Vuelve a clicar para deseleccionar")
+
 
 # ════════════════════════════════════════════════════════════════════════════
 # TAB: VISIÓN GENERAL
 # ════════════════════════════════════════════════════════════════════════════
-if st.session_state.current_tab == "general":
+@st.fragment
+@traced
+def general_tab(dataset, filters):
     
     # NUEVA GRÁFICA: Visitas por Año (INTERACTIVA)
-    st.subheader("📅 Visitas por Año")
-    
-    # Calcular visitas por año (sin filtro de persona para esta gráfica inicial)
-    if person_sel == "Todas":
-        year_totals = df_all.groupby("year").size().reset_index(name="visitas")
-    else:
-        year_totals = df_all[df_all["persona"] == person_sel].groupby("year").size().reset_index(name="visitas")
-    
-    year_totals = year_totals.sort_values("year")
-    
-    # Determinar qué año está seleccionado
-    selected_year = st.session_state.selected_year_from_chart
-    
-    # Colorear barras: seleccionada en morado fuerte, resto en gris
-    year_totals["color"] = year_totals["year"].apply(
-        lambda y: "#6366f1" if y == selected_year else "#cbd5e1"
-    )
-    
-    fig_year = go.Figure(go.Bar(
-        x=year_totals["year"],
-        y=year_totals["visitas"],
-        marker_color=year_totals["color"],
-        text=year_totals["visitas"],
-        textposition="outside",
-        textfont=dict(size=14, weight=700),
-        hovertemplate="<b>%{x}</b><br>%{y} visitas<extra></extra>",
-    ))
-    
-    fig_year.update_layout(
-        height=280,
-        margin=dict(t=30, b=40, l=40, r=20),
-        xaxis=dict(title="Año", tickfont=dict(size=13)),
-        yaxis=dict(title="Visitas"),
-        showlegend=False,
-        plot_bgcolor="white",
-        hovermode="x unified",
-    )
-    
-    # Mostrar gráfica con eventos de selección
-    event = st.plotly_chart(fig_year, use_container_width=True, on_select="rerun", key="year_chart")
-    
-    # Capturar clic en la barra
-    if event and "selection" in event and "points" in event["selection"]:
-        points = event["selection"]["points"]
-        if points:
-            clicked_year = points[0].get("x")
-            # Toggle: si ya estaba seleccionado, deseleccionar
-            if st.session_state.selected_year_from_chart == clicked_year:
-                st.session_state.selected_year_from_chart = None
-            else:
-                st.session_state.selected_year_from_chart = clicked_year
-            st.rerun()
-    
-    st.caption("💡 Haz clic en una barra para filtrar ese año · Vuelve a clicar para deseleccionar")
+    year_chart_fragment(dataset, filters)
     
     st.divider()
     
     # Visitas por mes
     st.subheader("📅 Visitas por Mes")
-    monthly = df.groupby(["ym","mes_label"]).size().reset_index(name="visitas").sort_values("ym")
-    
-    if not monthly.empty:
-        max_m = monthly["visitas"].max()
-        monthly["color"] = monthly["visitas"].apply(lambda v: "#6366f1" if v == max_m else "#c7d2fe")
-        
-        fig = go.Figure(go.Bar(
-            x=monthly["mes_label"],
-            y=monthly["visitas"],
-            marker_color=monthly["color"],
-            text=monthly["visitas"],
-            textposition="outside",
-            textfont=dict(size=10),
-        ))
-        fig.update_layout(
-            height=300,
-            margin=dict(t=30, b=80, l=40, r=20),
-            xaxis=dict(tickangle=-45, tickfont=dict(size=10)),
-            yaxis=dict(title="Visitas"),
-            showlegend=False,
-            plot_bgcolor="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    show_chart(charts.monthly_chart, dataset, filters, max_time_points())
     
     st.divider()
     
     # Visitas por consultora - BARRAS HORIZONTALES
     st.subheader("👤 Visitas por Consultora")
-    
-    person_df = (df.groupby("persona").size()
-                   .reindex(active_persons, fill_value=0)
-                   .reset_index(name="visitas")
-                   .sort_values("visitas", ascending=True))
-    person_df = person_df[person_df["visitas"] > 0]
-    
-    if not person_df.empty:
-        person_df["color"] = person_df["persona"].map(PERSON_COLORS)
-        
-        fig = go.Figure(go.Bar(
-            x=person_df["visitas"],
-            y=person_df["persona"],
-            orientation="h",
-            marker_color=person_df["color"],
-            text=person_df["visitas"],
-            textposition="outside",
-            textfont=dict(size=12),
-        ))
-        fig.update_layout(
-            height=max(250, len(person_df) * 40),
-            margin=dict(t=20, b=20, l=100, r=60),
-            xaxis=dict(title="Visitas"),
-            yaxis=dict(tickfont=dict(size=12)),
-            showlegend=False,
-            plot_bgcolor="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    show_chart(charts.person_chart, dataset, filters)
 
 # ════════════════════════════════════════════════════════════════════════════
 # TAB: CENTROS
 # ════════════════════════════════════════════════════════════════════════════
-elif st.session_state.current_tab == "centros":
-    st.subheader(f"🏫 Top {top_n} Centros Educativos")
-    
-    centro_df = (df.groupby("centro").size()
-                   .reset_index(name="visitas")
-                   .sort_values("visitas", ascending=False)
-                   .head(top_n)
-                   .sort_values("visitas", ascending=True))
-    
-    if not centro_df.empty:
-        max_c = centro_df["visitas"].max()
-        
-        def get_color(v):
-            if v >= max_c * 0.75: return "#6366f1"
-            elif v >= max_c * 0.5: return "#818cf8"
-            elif v >= max_c * 0.25: return "#a5b4fc"
-            return "#c7d2fe"
+def reset_centro_page():
+    st.session_state.centro_page = 1
+
+def open_centro_from_chart():
+    # Callback del clic en una barra del ranking: abre el detalle del centro
+    points = st.session_state.centro_chart["selection"]["points"]
+    if points:
+        st.session_state.centro_detail = points[0]["y"]
+
+def close_centro_detail():
+    st.session_state.pop("centro_detail", None)
+
+@st.fragment
+@traced
+def centro_detail(dataset):
+    # El centro se lee del estado y no de los argumentos: al cerrar, este
+    # fragmento se relanza solo y ya no debe mostrar nada
+    centro = st.session_state.get("centro_detail")
+    rows = dataset.centro_index.rows(centro) if centro else []
+    if len(rows) == 0:
+        return
+    # Solo las filas del centro (ver dataset.CentroIndex), nunca la tabla entera
+    visits = dataset.df.iloc[rows]
+    
+    with st.container(border=True):
+        col_t, col_x = st.columns([4, 1])
+        with col_t:
+            st.subheader(f"🔎 {centro}")
+        with col_x:
+            st.button("✕ Cerrar", key="close_centro_detail", on_click=close_centro_detail,
+                      use_container_width=True)
+        st.caption(f"{len(rows):,} visitas · Primera {visits['fecha'].min():%d/%m/%Y} · "
+                   f"Última {visits['fecha'].max():%d/%m/%Y} · Todo el histórico, sin filtros")
+        show_chart(charts.centro_month_chart, dataset, Filters(), centro, max_time_points())
         
-        centro_df["color"] = centro_df["visitas"].apply(get_color)
+        for col, (dim, title) in zip(st.columns(3), [("persona", "👤 Consultoras"), ("duracion", "⏱ Duración"),
+                                                      ("hora", "🕐 Hora de inicio")]):
+            with col:
+                st.markdown(f"**{title}**")
+                show_chart(charts.centro_breakdown_chart, dataset, Filters(), centro, dim)
         
-        fig = go.Figure(go.Bar(
-            x=centro_df["visitas"],
-            y=centro_df["centro"],
-            orientation="h",
-            marker_color=centro_df["color"],
-            text=centro_df["visitas"],
-            textposition="outside",
-            textfont=dict(size=11),
-        ))
-        fig.update_layout(
-            height=max(400, len(centro_df) * 28),
-            margin=dict(t=20, b=20, l=200, r=70),
-            xaxis=dict(title="Visitas", showgrid=True, gridcolor="#f1f5f9"),
-            yaxis=dict(tickfont=dict(size=11)),
-            showlegend=False,
-            plot_bgcolor="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
+        st.markdown("**Últimas visitas**")
+        recent = visits.sort_values("fecha", ascending=False, kind="stable").head(10)
+        st.dataframe(recent[["fecha", "persona", "hora", "duracion"]], hide_index=True, use_container_width=True,
+                     column_config={"fecha": st.column_config.DateColumn("Fecha", format="DD/MM/YYYY"),
+                                    "persona": "Consultora", "hora": "Hora", "duracion": "Duración"})
+
+@st.fragment
+@traced
+def centros_tab(dataset, filters):
+    ranking = dataset.centro_ranking
+    col_n, col_q = st.columns(2)
+    with col_n:
+        top_n = st.slider("Top N centros", 10, min(50, len(dataset.cube.labels("centro"))), 20, 5,
+                          key="top_n_main", on_change=reset_centro_page)
+    with col_q:
+        query = st.text_input("🔎 Buscar centro", key="centro_search", placeholder="Empieza por...",
+                              on_change=reset_centro_page).strip()
+    
+    # Más allá del Top N, el ranking se recorre por páginas de N centros
+    codes = ranking.search(query) if query else None
+    n_ranked = ranking.size(filters, codes)
+    n_pages = max(1, -(-n_ranked // top_n))
+    page = 1
+    if n_pages > 1:
+        if st.session_state.get("centro_page", 1) > n_pages:
+            st.session_state.centro_page = n_pages
+        page = st.number_input(f"Página (de {n_pages})", 1, n_pages, key="centro_page")
+    start, stop = (page - 1) * top_n, min(page * top_n, n_ranked)
+    
+    if query:
+        st.subheader(f"🏫 Centros que coinciden con «{query}» ({n_ranked})")
+    elif page == 1:
+        st.subheader(f"🏫 Top {top_n} Centros Educativos")
+    else:
+        st.subheader(f"🏫 Centros {start + 1}-{stop} de {n_ranked}")
+    if n_ranked == 0:
+        st.info("Ningún centro con visitas coincide con la búsqueda" if query else "Sin visitas con estos filtros")
+        return
+    
+    centro_detail(dataset)
+    
+    show_chart(charts.centro_chart, dataset, filters, top_n, page - 1, query,
+               on_select=open_centro_from_chart, selection_mode="points", key="centro_chart")
+    st.caption("💡 Haz clic en un centro para ver su histórico")
 
 # ════════════════════════════════════════════════════════════════════════════
 # TAB: EVOLUCIÓN
 # ════════════════════════════════════════════════════════════════════════════
-elif st.session_state.current_tab == "evolucion":
+@st.fragment
+@traced
+def evolucion_tab(dataset, filters):
     
     # Evolución mensual
     st.subheader("📈 Evolución Mensual por Consultora")
-    
-    months_sorted = sorted(df["ym"].unique())
-    evol_rows = []
-    for ym in months_sorted:
-        sub = df[df["ym"] == ym]
-        label = MESES[ym[5:7]] + " " + ym[2:4]
-        row = {"label": label, "ym": ym}
-        for p in active_persons:
-            row[p] = int((sub["persona"] == p).sum())
-        evol_rows.append(row)
-    
-    df_evol = pd.DataFrame(evol_rows) if evol_rows else pd.DataFrame()
-    
-    if not df_evol.empty:
-        fig = go.Figure()
-        for p in active_persons:
-            if p in df_evol.columns:
-                fig.add_trace(go.Scatter(
-                    x=df_evol["label"],
-                    y=df_evol[p],
-                    mode="lines+markers",
-                    name=p,
-                    line=dict(color=PERSON_COLORS[p], width=2),
-                    marker=dict(size=4),
-                ))
-        fig.update_layout(
-            height=350,
-            margin=dict(t=20, b=80, l=40, r=20),
-            xaxis=dict(tickangle=-45, tickfont=dict(size=9)),
-            yaxis=dict(title="Visitas"),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02),
-            plot_bgcolor="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    show_chart(charts.evolution_line_chart, dataset, filters, max_time_points())
     
     st.divider()
     
     # Distribución apilada
     st.subheader("📊 Distribución Mensual Apilada")
-    
-    if not df_evol.empty:
-        fig = go.Figure()
-        for p in active_persons:
-            if p in df_evol.columns:
-                fig.add_trace(go.Bar(
-                    x=df_evol["label"],
-                    y=df_evol[p],
-                    name=p,
-                    marker_color=PERSON_COLORS[p],
-                ))
-        fig.update_layout(
-            barmode="stack",
-            height=350,
-            margin=dict(t=20, b=80, l=40, r=20),
-            xaxis=dict(tickangle=-45, tickfont=dict(size=9)),
-            yaxis=dict(title="Visitas"),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02),
-            plot_bgcolor="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    show_chart(charts.evolution_stack_chart, dataset, filters, max_time_points())
     
     st.divider()
     
     # Comparativa anual
     st.subheader("📆 Comparativa Anual por Consultora")
-    
-    year_colors = {"2023":"#e2e8f0","2024":"#a5b4fc","2025":"#6366f1","2026":"#312e81"}
-    persons_comp = [person_sel] if person_sel != "Todas" else PERSONS
-    
-    comp_data = []
-    for p in persons_comp:
-        row = {"persona": p}
-        for y in ["2023","2024","2025","2026"]:
-            count = len(df_all[(df_all["year"] == y) & (df_all["persona"] == p)])
-            row[y] = count
-        comp_data.append(row)
-    
-    df_comp = pd.DataFrame(comp_data)
-    
-    if not df_comp.empty:
-        fig = go.Figure()
-        for yr, color in year_colors.items():
-            if yr in df_comp.columns:
-                fig.add_trace(go.Bar(
-                    x=df_comp["persona"],
-                    y=df_comp[yr],
-                    name=yr,
-                    marker_color=color,
-                    text=df_comp[yr],
-                    textposition="outside",
-                    textfont=dict(size=9),
-                ))
-        fig.update_layout(
-            barmode="group",
-            height=350,
-            margin=dict(t=30, b=40, l=40, r=20),
-            xaxis=dict(tickfont=dict(size=11)),
-            yaxis=dict(title="Visitas"),
-            legend=dict(orientation="h", yanchor="bottom", y=1.02),
-            plot_bgcolor="white",
-        )
-        st.plotly_chart(fig, use_container_width=True)
+    show_chart(charts.annual_chart, dataset, filters)
 
 # ════════════════════════════════════════════════════════════════════════════
 # TAB: DURACIÓN & HORA
 # ════════════════════════════════════════════════════════════════════════════
-elif st.session_state.current_tab == "duracion":
+@st.fragment
+@traced
+def duracion_tab(dataset, filters):
     col_dur, col_hora = st.columns(2)
     
     # Duración - Pie Chart
     with col_dur:
         st.subheader("⏱ Duración de las Visitas")
-        
-        dur_df = (df["duracion"].dropna()
-                    .loc[df["duracion"].isin(DUR_ORDER)]
-                    .value_counts()
-                    .reindex(DUR_ORDER, fill_value=0)
-                    .reset_index())
-        dur_df.columns = ["duracion", "visitas"]
-        dur_df = dur_df[dur_df["visitas"] > 0]
-        
-        if not dur_df.empty:
-            dur_df["color"] = [DUR_COLORS[i] for i in range(len(dur_df))]
-            
-            fig = go.Figure(go.Pie(
-                labels=dur_df["duracion"],
-                values=dur_df["visitas"],
-                marker_colors=dur_df["color"],
-                textinfo="percent+label",
-                textfont=dict(size=11),
-                hovertemplate="<b>%{label}</b><br>%{value} visitas<br>%{percent}<extra></extra>",
-            ))
-            fig.update_layout(
-                height=400,
-                margin=dict(t=20, b=20, l=20, r=20),
-                showlegend=True,
-                legend=dict(font=dict(size=10)),
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        show_chart(charts.duration_chart, dataset, filters)
     
     # Hora - Barras horizontales
     with col_hora:
         st.subheader("🕐 Hora de Inicio")
+        show_chart(charts.hour_chart, dataset, filters)
+
+
+# ════════════════════════════════════════════════════════════════════════════
+# EXPORTAR
+# ════════════════════════════════════════════════════════════════════════════
+@st.fragment
+@traced
+def export_panel(dataset, filters):
+    # El fichero solo se genera al pulsar "Preparar" y por tramos (ver
+    # exports.py), no en cada ejecución de la app
+    tab = st.session_state.current_tab
+    with st.expander("📥 Exportar con los filtros actuales"):
+        col_t, col_f = st.columns([2, 1])
+        with col_t:
+            what = st.selectbox("Qué exportar", ["Visitas filtradas", *exports.TAB_TABLES[tab]],
+                                key=f"export_what_{tab}")
+        with col_f:
+            fmt = st.radio("Formato", list(exports.FORMATS), horizontal=True, key="export_format")
         
-        hora_df = (df["hora"].dropna()
-                     .loc[df["hora"].isin(HORA_ORDER)]
-                     .value_counts()
-                     .reindex(HORA_ORDER, fill_value=0)
-                     .reset_index())
-        hora_df.columns = ["hora", "visitas"]
-        hora_df = hora_df[hora_df["visitas"] > 0]
-        
-        if not hora_df.empty:
-            max_h = hora_df["visitas"].max()
-            
-            def get_hora_color(v):
-                if v == max_h: return "#6366f1"
-                elif v >= max_h * 0.7: return "#818cf8"
-                elif v >= max_h * 0.4: return "#a5b4fc"
-                return "#c7d2fe"
-            
-            hora_df["color"] = hora_df["visitas"].apply(get_hora_color)
-            
-            fig = go.Figure(go.Bar(
-                x=hora_df["visitas"],
-                y=hora_df["hora"],
-                orientation="h",
-                marker_color=hora_df["color"],
-                text=hora_df["visitas"],
-                textposition="outside",
-                textfont=dict(size=11),
-            ))
-            fig.update_layout(
-                height=400,
-                margin=dict(t=20, b=20, l=50, r=60),
-                xaxis=dict(title="Visitas", showgrid=True, gridcolor="#f1f5f9"),
-                yaxis=dict(
-                    categoryorder="array",
-                    categoryarray=HORA_ORDER,
-                    tickfont=dict(size=12),
-                ),
-                showlegend=False,
-                plot_bgcolor="white",
-            )
-            st.plotly_chart(fig, use_container_width=True)
+        key = (dataset.version, filters, tab, what, fmt)
+        prepared = st.session_state.get("export_file")
+        if prepared is not None and prepared[0] != key:
+            # Otra selección: se suelta el fichero anterior
+            del st.session_state.export_file
+            prepared = None
+        if prepared is None and st.button("Preparar descarga", key="export_prepare"):
+            with st.spinner("Preparando el fichero..."):
+                if what == "Visitas filtradas":
+                    chunks = exports.visit_chunks(dataset, filters)
+                else:
+                    chunks = exports.table_chunks(exports.TAB_TABLES[tab][what](dataset, filters))
+                with perf.span("export", what=what, fmt=fmt) as attrs:
+                    data = exports.export(chunks, fmt)
+                    attrs["bytes"] = len(data)
+            st.session_state.export_file = prepared = (key, data)
+        if prepared is not None:
+            ext, mime = exports.FORMATS[fmt]
+            size = len(prepared[1])
+            st.download_button(f"⬇️ Descargar ({size / 1e6:.1f} MB)" if size >= 1e6 else f"⬇️ Descargar ({size / 1e3:.0f} KB)",
+                               prepared[1],
+                               file_name=f"froca_{normalize_name(what).lower().replace(' ', '_')}.{ext}",
+                               mime=mime, on_click="ignore", key="export_download")
+
+
+TABS = {
+    "general": ("📊 Visión General", general_tab),
+    "centros": ("🏫 Centros", centros_tab),
+    "evolucion": ("📈 Evolución", evolucion_tab),
+    "duracion": ("⏱ Duración & Hora", duracion_tab),
+}
+
+def set_tab(tab):
+    st.session_state.current_tab = tab
+
+# ── NAVEGACIÓN CON BOTONES GRANDES ────────────────────────────────────────────
+@st.fragment
+@traced
+def tab_area(dataset, filters):
+    # Los botones cambian la pestaña en un callback, antes del rerun, así el
+    # botón resaltado ya corresponde a la pestaña que se muestra
+    for col, (tab, (label, _)) in zip(st.columns(len(TABS)), TABS.items()):
+        with col:
+            st.button(label, use_container_width=True, on_click=set_tab, args=(tab,),
+                      type="primary" if st.session_state.current_tab == tab else "secondary")
+    
+    st.divider()
+    
+    TABS[st.session_state.current_tab][1](dataset, filters)
+    
+    export_panel(dataset, filters)
+
+
+# ── KPIs ──────────────────────────────────────────────────────────────────────
+kpi_strip(dataset, filters)
+
+st.divider()
+
+tab_area(dataset, filters)
 
 # ── PIE DE PÁGINA ─────────────────────────────────────────────────────────────
 st.divider()
 st.caption("FROCA · Dashboard de Visitas · visitas_FROCA.xlsx")
+
+# Primera pintura de la sesión: su primera ejecución completa
+first_paint = "first_paint_ms" not in st.session_state
+if first_paint:
+    perf.annotate(first_paint=True)
+perf.end(run_trace)
+if first_paint:
+    st.session_state.first_paint_ms = run_trace.total_ms
+    st.session_state.first_paint_since_boot_ms = warmup.report_first_paint(run_trace.total_ms)
+
+# Diagnóstico de la caché de figuras y de los tiempos: añadir ?debug=1 a la URL
+if st.query_params.get("debug"):
+    fc = shared_cache().stats()
+    st.caption(f"🧮 Caché de figuras: {fc.hits} aciertos · {fc.misses} fallos ({fc.hit_rate:.0%}) · "
+               f"{fc.entries} entradas · {fc.bytes / 1e6:.1f} MB · {fc.evictions} expulsadas")
+    since_boot = st.session_state.first_paint_since_boot_ms
+    st.caption(f"🚀 Primera pintura de esta sesión: {st.session_state.first_paint_ms:.0f} ms "
+               f"(presupuesto {FIRST_PAINT_BUDGET_MS} ms)"
+               + (f" · {since_boot / 1000:.1f} s desde el arranque del proceso" if since_boot else ""))
+    with st.expander(f"⏱ Tiempos de esta ejecución: {run_trace.total_ms:.0f} ms"):
+        st.dataframe(run_trace.spans, hide_index=True, use_container_width=True)
+        # Ejecuciones recientes de esta sesión, incluidos los fragmentos
+        # relanzados solos: la etapa más lenta señala la gráfica culpable
+        recent = []
+        for run in reversed(perf.read_log(session=st.session_state.perf_session, limit=20)):
+            charts_ms = [sp for sp in run["spans"] if sp["name"].split("/")[-1].startswith("chart:")]
+            slowest = max(charts_ms, key=lambda sp: sp["ms"], default=None)
+            recent.append({"hora": run["ts"][11:19], "ejecución": run["run"], "pestaña": run.get("tab"),
+                           "ms": run["total_ms"],
+                           "gráfica más lenta": slowest and slowest["name"].split("/")[-1][6:],
+                           "ms gráfica": slowest and slowest["ms"]})
+        st.caption("Ejecuciones recientes (perf.jsonl)")
+        st.dataframe(recent, hide_index=True, use_container_width=True)
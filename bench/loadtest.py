@@ -0,0 +1,399 @@
+"""Prueba de carga: varias sesiones a la vez contra ``streamlit run app.py`` en local.
+
+Arranca la app en un puerto libre de localhost y abre N sesiones por el mismo
+websocket que usa el navegador (``/_stcore/stream``, mensajes protobuf de
+Streamlit). Cada sesión carga la app y repite un recorrido como el de un
+usuario: pestaña Centros, mover "Top N centros", volver a Visión General,
+clic en una barra de "Visitas por Año", elegir consultora, quitar el año y
+pasar por Evolución y Duración, con una pausa aleatoria entre clics. Los
+botones de navegación, la gráfica de años y el slider están dentro de
+fragmentos, así que se relanzan igual que en el navegador.
+
+Para cada número de sesiones se mide la latencia de cada interacción (del
+envío al ``script_finished``) con sus percentiles p50/p95/p99, las
+ejecuciones por segundo y la memoria residente del servidor: en reposo, con
+todas las sesiones abiertas, el pico y el incremento por sesión. No hace
+falta ningún servicio externo; cliente y servidor comparten la máquina, así
+que con muchas sesiones el propio cliente resta algo de CPU.
+
+    python -m bench.loadtest                               # 1, 5, 10 y 20 sesiones
+    python -m bench.loadtest --sessions 1 10 50 --rounds 5 --think 0.5
+    python -m bench.loadtest --rows 100000                 # visitas sintéticas (bench/synth.py)
+    python -m bench.loadtest --compare bench/results/loadtest-base.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from bench.run import RESULTS, ROOT, metadata
+
+SESSIONS = [1, 5, 10, 20]
+PERCENTILES = (50, 95, 99)
+RERUN_TIMEOUT = 120
+
+# Botones de navegación (app.py) por la pestaña a la que llevan
+NAV = {"general": "Visión General", "centros": "Centros", "evolucion": "Evolución",
+       "duracion": "Duración"}
+
+# Recorrido de cada ronda: (nombre de la medida, acción)
+ROUND = [
+    ("nav:centros", ("nav", "centros")),
+    ("top_n", ("top_n",)),
+    ("nav:general", ("nav", "general")),
+    ("year_bar", ("year_bar",)),
+    ("consultora", ("consultora",)),
+    ("year_bar", ("year_bar",)),
+    ("nav:evolucion", ("nav", "evolucion")),
+    ("nav:duracion", ("nav", "duracion")),
+]
+
+# Estados de ScriptFinishedStatus (streamlit/proto/ForwardMsg.proto)
+_FINISHED = {0, 3}           # ejecución completa / de fragmento terminada
+_FINISHED_EARLY_FOR_RERUN = 2
+
+
+# ── SERVIDOR ──────────────────────────────────────────────────────────────────
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def server(env, port, timeout=120):
+    """``streamlit run app.py`` en ``port`` hasta salir del bloque."""
+    cmd = [sys.executable, "-m", "streamlit", "run", str(ROOT / "app.py"),
+           "--server.headless", "true", "--server.port", str(port),
+           "--server.address", "127.0.0.1", "--server.fileWatcherType", "none",
+           "--browser.gatherUsageStats", "false"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if proc.poll() is not None:
+                raise RuntimeError(f"streamlit ha terminado al arrancar:\n{proc.stderr.read().decode()}")
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"streamlit no responde en el puerto {port}")
+                time.sleep(0.2)
+        yield proc
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def rss_mb(pid):
+    """Memoria residente de ``pid`` en MB (``/proc`` en Linux, ``ps`` en otros)."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    out = subprocess.run(["ps", "-o", "rss=", "-p", str(pid)], capture_output=True, text=True).stdout
+    return int(out.strip() or 0) / 1024
+
+
+# ── SESIÓN ────────────────────────────────────────────────────────────────────
+class Session:
+    """Una pestaña del navegador: websocket, widgets vistos y estado enviado.
+
+    Como el frontend, recuerda los ids de los widgets que llegan en los
+    ``delta`` (cambian cuando cambian sus parámetros, p. ej. la figura de años)
+    y el fragmento en el que están, y guarda los mensajes cacheables porque el
+    servidor solo manda su hash cuando la sesión ya los recibió.
+    """
+
+    def __init__(self, port, rng):
+        self.port = port
+        self.rng = rng
+        self.ws = None
+        self.widgets = {}   # clave lógica -> (elemento, fragment_id)
+        self._cache = {}    # hash -> ForwardMsg
+        self.latencies = {}
+        self.errors = 0
+
+    async def connect(self):
+        from tornado.websocket import websocket_connect
+
+        self.ws = await websocket_connect(f"ws://127.0.0.1:{self.port}/_stcore/stream",
+                                          max_message_size=256 * 1024 * 1024)
+        return await self.rerun()
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+
+    async def rerun(self, widget=None, fragment_id=""):
+        """Envía una ejecución con el estado de ``widget`` y espera a que termine (ms)."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.query_string = ""
+        state.page_script_hash = ""
+        state.fragment_id = fragment_id
+        if widget is not None:
+            state.widget_states.widgets.append(widget)
+        t0 = time.perf_counter()
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+        await asyncio.wait_for(self._until_finished(), RERUN_TIMEOUT)
+        return (time.perf_counter() - t0) * 1000
+
+    async def _until_finished(self):
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        while True:
+            raw = await self.ws.read_message()
+            if raw is None:
+                raise ConnectionError("el servidor ha cerrado el websocket")
+            fm = ForwardMsg.FromString(raw)
+            kind = fm.WhichOneof("type")
+            if kind == "ref_hash":
+                fm = self._cache[fm.ref_hash]
+                kind = fm.WhichOneof("type")
+            elif fm.metadata.cacheable:
+                self._cache[fm.hash] = fm
+            if kind == "delta" and fm.delta.WhichOneof("type") == "new_element":
+                if fm.delta.new_element.WhichOneof("type") == "exception":
+                    raise RuntimeError(fm.delta.new_element.exception.message)
+                self._remember(fm.delta.new_element, fm.delta.fragment_id)
+            elif kind == "script_finished":
+                if fm.script_finished in _FINISHED:
+                    return
+                if fm.script_finished != _FINISHED_EARLY_FOR_RERUN:
+                    raise RuntimeError(f"ejecución terminada con estado {fm.script_finished}")
+
+    def _remember(self, element, fragment_id):
+        kind = element.WhichOneof("type")
+        if kind == "button":
+            self.widgets[f"button:{element.button.label}"] = (element.button, fragment_id)
+        elif kind in ("multiselect", "slider", "plotly_chart"):
+            widget = getattr(element, kind)
+            # Los widgets con key terminan su id en ella: "$$ID-<hash>-<key>"
+            key = widget.id.rsplit("-", 1)[-1]
+            if key != "None":
+                self.widgets[key] = (widget, fragment_id)
+
+    # ── Acciones ──────────────────────────────────────────────────────────────
+    def _state(self, key):
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        if key not in self.widgets:
+            raise RuntimeError(f"el widget {key!r} no está en la página")
+        element, fragment_id = self.widgets[key]
+        return WidgetState(id=element.id), element, fragment_id
+
+    async def nav(self, tab):
+        key = next(k for k in self.widgets if k.startswith("button:") and NAV[tab] in k)
+        state, _, fragment_id = self._state(key)
+        state.trigger_value = True
+        return await self.rerun(state, fragment_id)
+
+    async def top_n(self):
+        state, slider, fragment_id = self._state("top_n_main")
+        values = np.arange(slider.min, slider.max + slider.step / 2, slider.step)
+        state.double_array_value.data.append(float(self.rng.choice(values)))
+        return await self.rerun(state, fragment_id)
+
+    async def year_bar(self):
+        # Primer clic: añade un año al filtro; el segundo lo vuelve a quitar
+        # (toggle en app.py). La gráfica es nueva tras cada clic, así que la
+        # selección siempre cambia para el servidor.
+        from config import YEARS
+
+        state, _, fragment_id = self._state("year_chart")
+        year = getattr(self, "_year", None)
+        if year is None:
+            self._year = year = self.rng.choice(YEARS)
+        else:
+            self._year = None
+        state.string_value = json.dumps({"selection": {
+            "points": [{"x": str(year), "curve_number": 0, "point_number": 0, "point_index": 0}],
+            "point_indices": [0], "box": [], "lasso": []}})
+        return await self.rerun(state, fragment_id)
+
+    async def consultora(self):
+        # Una consultora al azar o, una de cada tres veces, todas
+        state, multiselect, fragment_id = self._state("person_filter_main")
+        if self.rng.random() > 1 / 3:
+            state.int_array_value.data.append(self.rng.randrange(len(multiselect.options)))
+        else:
+            state.int_array_value.SetInParent()
+        return await self.rerun(state, fragment_id)
+
+    async def walk(self, rounds, think):
+        for _ in range(rounds):
+            for name, (action, *args) in ROUND:
+                await asyncio.sleep(self.rng.uniform(0, 2 * think))
+                try:
+                    ms = await getattr(self, action)(*args)
+                except (asyncio.TimeoutError, RuntimeError) as e:
+                    print(f"  {name}: {e}", file=sys.stderr)
+                    self.errors += 1
+                    continue
+                self.latencies.setdefault(name, []).append(ms)
+
+
+# ── MEDICIÓN DE UN NÚMERO DE SESIONES ─────────────────────────────────────────
+async def load_level(port, pid, sessions, rounds, think, seed):
+    baseline = rss_mb(pid)
+    peak = baseline
+    stop = asyncio.Event()
+
+    async def sample():
+        nonlocal peak
+        while not stop.is_set():
+            peak = max(peak, rss_mb(pid))
+            await asyncio.sleep(0.2)
+
+    sampler = asyncio.create_task(sample())
+    clients = [Session(port, random.Random(seed * 1000 + i)) for i in range(sessions)]
+    try:
+        t0 = time.perf_counter()
+        first = await asyncio.gather(*(c.connect() for c in clients))
+        t1 = time.perf_counter()
+        await asyncio.gather(*(c.walk(rounds, think) for c in clients))
+        elapsed = time.perf_counter() - t1
+        rss = rss_mb(pid)
+    finally:
+        stop.set()
+        await sampler
+        for c in clients:
+            c.close()
+
+    by_action = {}
+    for c in clients:
+        for name, values in c.latencies.items():
+            by_action.setdefault(name, []).extend(values)
+    every = [ms for values in by_action.values() for ms in values]
+    result = {
+        **_percentiles("rerun", every),
+        "rerun_max_ms": round(max(every), 1) if every else None,
+        **_percentiles("first_load", first),
+        "reruns": len(every),
+        "errors": sum(c.errors for c in clients),
+        "throughput_per_s": round(len(every) / elapsed, 2),
+        "connect_s": round(t1 - t0, 2),
+        "rss_idle_mb": round(baseline, 1),
+        "rss_mb": round(rss, 1),
+        "rss_peak_mb": round(peak, 1),
+        "rss_per_session_mb": round((rss - baseline) / sessions, 2),
+        "actions": {name: _percentiles("", values) for name, values in by_action.items()},
+    }
+    return result
+
+
+def _percentiles(prefix, values):
+    name = f"{prefix}_p" if prefix else "p"
+    if not values:
+        return {f"{name}{p}_ms": None for p in PERCENTILES}
+    return {f"{name}{p}_ms": round(float(v), 1)
+            for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+
+# ── INFORME ───────────────────────────────────────────────────────────────────
+COLUMNS = [
+    ("rerun_p50_ms", "p50 ms"), ("rerun_p95_ms", "p95 ms"), ("rerun_p99_ms", "p99 ms"),
+    ("first_load_p95_ms", "carga p95 ms"), ("throughput_per_s", "ejecuciones/s"),
+    ("rss_mb", "RSS MB"), ("rss_peak_mb", "pico MB"), ("rss_per_session_mb", "MB/sesión"),
+    ("errors", "errores"),
+]
+
+
+def markdown(report, base=None):
+    lines = ["| sesiones | " + " | ".join(title for _, title in COLUMNS) + " |",
+             "|---" * (len(COLUMNS) + 1) + "|"]
+    for sessions, result in report["results"].items():
+        cells = []
+        for name, _ in COLUMNS:
+            value = result.get(name)
+            if value is None or isinstance(value, int):
+                cells.append("—" if value is None else f"{value:,}")
+                continue
+            cell = f"{value:,.2f}" if value < 10 else f"{value:,.1f}"
+            previous = (base or {}).get("results", {}).get(sessions, {}).get(name)
+            if previous:
+                cell += f" (×{value / previous:.2f})"
+            cells.append(cell)
+        lines.append(f"| {sessions} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=SESSIONS)
+    parser.add_argument("--rounds", type=int, default=3, help="recorridos completos por sesión")
+    parser.add_argument("--think", type=float, default=0.5,
+                        help="pausa media entre clics en segundos (0: sin pausa)")
+    parser.add_argument("--rows", type=int, help="visitas sintéticas en lugar de la fuente configurada")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, help="JSON de resultados (por defecto bench/results/loadtest-<fecha>.json)")
+    parser.add_argument("--compare", type=Path, help="JSON de una prueba de carga anterior")
+    args = parser.parse_args()
+
+    out = args.out or RESULTS / f"loadtest-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    report = {"meta": {**metadata(), "rows": args.rows, "rounds": args.rounds, "think_s": args.think},
+              "results": {}}
+    # Los tiempos por etapa del servidor quedan junto a los resultados
+    env = dict(os.environ, FROCA_PERF_LOG=str(out.with_suffix(".perf.jsonl")))
+
+    with tempfile.TemporaryDirectory(prefix="froca-load-") as workdir:
+        if args.rows:
+            from bench.synth import synthetic_frame, write_workbooks
+
+            write_workbooks(synthetic_frame(args.rows, args.seed), workdir)
+            env["FROCA_DATA_SOURCE"] = workdir
+        port = free_port()
+        with server(env, port) as proc:
+            # Primera sesión con el servidor recién arrancado: carga de datos
+            # y precalentamiento, fuera de las medidas por número de sesiones
+            t0 = time.perf_counter()
+            report["meta"]["cold_first_load_ms"] = round(asyncio.run(_first_load(port)), 1)
+            report["meta"]["rss_started_mb"] = round(rss_mb(proc.pid), 1)
+            print(f"arranque en frío: {(time.perf_counter() - t0):.1f} s", file=sys.stderr)
+            for sessions in args.sessions:
+                print(f"{sessions} sesiones...", file=sys.stderr)
+                report["results"][str(sessions)] = asyncio.run(
+                    load_level(port, proc.pid, sessions, args.rounds, args.think, args.seed))
+
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+    base = json.loads(args.compare.read_text()) if args.compare else None
+    table = markdown(report, base)
+    out.with_suffix(".md").write_text(table + "\n")
+    print(table)
+    print(f"\n{out}", file=sys.stderr)
+
+
+async def _first_load(port):
+    session = Session(port, random.Random(0))
+    try:
+        return await session.connect()
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Banco de pruebas de rendimiento con datos sintéticos (ver bench/synth.py).
+
+Para cada tamaño se mide, en un proceso aparte: la carga (Excel en frío,
+desde la instantánea y construcción del ``Dataset``), el filtrado del cubo,
+la agregación y la serialización de las gráficas de cada pestaña y, con
+AppTest, la ejecución completa de la app al abrirla y al cambiar de pestaña
+o de filtro. Los resultados se guardan en JSON y como tabla markdown; con
+``--compare`` se añade la variación frente a una ejecución anterior.
+
+    python -m bench.run                                  # 10k y 100k filas
+    python -m bench.run --rows 10000 1000000 10000000    # >100k: sin Excel ni AppTest
+    python -m bench.run --compare bench/results/base.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RESULTS = ROOT / "bench" / "results"
+SIZES = [10_000, 100_000]
+
+# Gráficas de cada rama de ``current_tab`` (app.py)
+TAB_CHARTS = {
+    "general": ["year_chart", "monthly_chart", "person_chart"],
+    "centros": ["centro_chart"],
+    "evolucion": ["evolution_line_chart", "evolution_stack_chart", "annual_chart"],
+    "duracion": ["duration_chart", "hour_chart"],
+}
+TAB_LABELS = {"general": "Visión General", "centros": "Centros", "evolucion": "Evolución",
+              "duracion": "Duración"}
+
+
+def timed(fn, repeat=1):
+    """Mediana en milisegundos de ``repeat`` llamadas y el último resultado."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return sorted(times)[len(times) // 2], result
+
+
+# ── MEDICIÓN DE UN TAMAÑO (proceso hijo) ──────────────────────────────────────
+def bench_size(rows, workdir, workbook, repeat):
+    import plotly.io as pio
+
+    import charts
+    from bench.synth import synthetic_frame, write_workbooks
+    from config import PERSONS, USECOLS, YEARS
+    from dataset import Filters, build_dataset
+    from loader import normalize
+    from sources import load_source
+
+    results = {}
+    raw = synthetic_frame(rows)
+    if workbook:
+        write_workbooks(raw, workdir)
+        results["load/excel_cold"], df = timed(lambda: load_source(workdir))
+        results["load/snapshot"], df = timed(lambda: load_source(workdir), repeat)
+    else:
+        results["load/normalize"], df = timed(lambda: normalize(raw.iloc[:, USECOLS].copy()))
+    del raw
+    results["load/build_dataset"], dataset = timed(lambda: build_dataset(df, 1))
+    cube = dataset.cube
+
+    top_centro = cube.counts("centro").idxmax()
+    scenarios = {
+        "todo": Filters(),
+        "consultora": Filters(personas=(PERSONS[2],)),
+        "anyo": Filters(years=(YEARS[1],)),
+        "consultora+centro": Filters(personas=(PERSONS[2],), centros=(top_centro,)),
+        "rango_meses": Filters(ym_from=YEARS[1] * 12 + 3, ym_to=YEARS[1] * 12 + 8),
+    }
+    for name, filters in scenarios.items():
+        results[f"filter/{name}"], _ = timed(lambda: cube.select(filters), repeat)
+
+    for tab, builders in TAB_CHARTS.items():
+        build_ms = serialize_ms = size = 0
+        for filters in scenarios.values():
+            for builder in builders:
+                fn = getattr(charts, builder)
+                args = (20,) if builder == "centro_chart" else ()
+                ms, fig = timed(lambda: fn(dataset, filters, *args), repeat)
+                build_ms += ms
+                if fig is not None:
+                    ms, spec = timed(lambda: pio.to_json(fig, validate=False), repeat)
+                    serialize_ms += ms
+                    size += len(spec)
+        results[f"tab/{tab}/build"] = build_ms / len(scenarios)
+        results[f"tab/{tab}/serialize"] = serialize_ms / len(scenarios)
+        results[f"tab/{tab}/json_kb"] = size / len(scenarios) / 1024
+
+    if workbook:
+        results.update(bench_app(repeat))
+    return {name: round(value, 3) for name, value in results.items()}
+
+
+def bench_app(repeat):
+    """Ejecuciones completas de app.py con AppTest (los datos ya están en la instantánea)."""
+    from streamlit.testing.v1 import AppTest
+
+    from config import PERSONS
+
+    results = {}
+    at = AppTest.from_file(str(ROOT / "app.py"), default_timeout=600)
+    results["app/first_run"], _ = timed(at.run)
+    _check(at)
+    for tab in [*list(TAB_LABELS)[1:], "general"]:
+        button = next(b for b in at.button if TAB_LABELS[tab] in b.label)
+        results[f"app/tab/{tab}"], _ = timed(lambda: button.click().run())
+        _check(at)
+    results["app/filter_consultora"], _ = timed(
+        lambda: at.multiselect(key="person_filter_main").set_value([PERSONS[2]]).run())
+    _check(at)
+    # Misma vista otra vez: figuras desde la caché LRU
+    at.multiselect(key="person_filter_main").set_value([]).run()
+    results["app/rerun_cached"], _ = timed(at.run, repeat)
+    return results
+
+
+def _check(at):
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+
+# ── ORQUESTACIÓN ──────────────────────────────────────────────────────────────
+def run_child(rows, workbook, repeat):
+    with tempfile.TemporaryDirectory(prefix="froca-bench-") as workdir:
+        env = dict(os.environ, FROCA_DATA_SOURCE=workdir)
+        cmd = [sys.executable, "-m", "bench.run", "--child", str(rows), "--workdir", workdir,
+               "--repeat", str(repeat)] + (["--workbook"] if workbook else [])
+        out = subprocess.run(cmd, cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def metadata():
+    import pandas as pd
+    import streamlit
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    return {"date": datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "pandas": pd.__version__,
+            "streamlit": streamlit.__version__, "machine": platform.machine(),
+            "cpus": os.cpu_count()}
+
+
+def markdown(report, base=None):
+    sizes = list(report["results"])
+    names = list(dict.fromkeys(n for size in sizes for n in report["results"][size]))
+    lines = ["| métrica (ms; _kb en KB) | " + " | ".join(f"{int(s):,} filas" for s in sizes) + " |",
+             "|---" * (len(sizes) + 1) + "|"]
+    for name in names:
+        cells = []
+        for size in sizes:
+            value = report["results"][size].get(name)
+            cell = "—" if value is None else f"{value:,.2f}" if value < 10 else f"{value:,.1f}"
+            previous = (base or {}).get("results", {}).get(size, {}).get(name)
+            if value is not None and previous:
+                cell += f" (×{value / previous:.2f})"
+            cells.append(cell)
+        lines.append(f"| {name} | " + " | ".join(cells) + " |")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--workbook-max", type=int, default=100_000,
+                        help="tamaño máximo para el que se genera el Excel y se ejecuta AppTest")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--out", type=Path, help="JSON de resultados (por defecto bench/results/<fecha>.json)")
+    parser.add_argument("--compare", type=Path, help="JSON de una ejecución anterior")
+    parser.add_argument("--child", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--workbook", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(bench_size(args.child, args.workdir, args.workbook, args.repeat)))
+        return
+
+    report = {"meta": metadata(), "results": {}}
+    for rows in args.rows:
+        print(f"{rows:,} filas...", file=sys.stderr)
+        report["results"][str(rows)] = run_child(rows, rows <= args.workbook_max, args.repeat)
+
+    out = args.out or RESULTS / f"{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    base = json.loads(args.compare.read_text()) if args.compare else None
+    table = markdown(report, base)
+    out.with_suffix(".md").write_text(table + "\n")
+    print(table)
+    print(f"\n{out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""Visitas sintéticas con el esquema de la hoja "Datos", para medir rendimiento.
+
+``synthetic_frame`` genera las columnas A-H tal como vienen en el Excel
+(consultoras de ``PERSONS``, duraciones de ``DUR_ORDER``, horas de
+``HORA_ORDER``), con un pequeño porcentaje de ruido que la normalización
+debe limpiar: mayúsculas/espacios, consultoras desconocidas, años fuera de
+``YEARS`` y celdas vacías. ``write_workbooks`` las guarda como libros .xlsx
+(uno por cada millón de filas, el máximo de una hoja) escribiendo el XML
+directamente, porque openpyxl tarda demasiado en los tamaños grandes.
+
+    python -m bench.synth 100000 bench/data/100k
+"""
+
+import argparse
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from config import DUR_ORDER, HORA_ORDER, PERSONS, SHEET_NAME, YEARS
+
+HEADER = ["Marca de temps", "Adreça electrònica", "PERSONA QUE REALIZA LA VISITA",
+          "CENTRO VISITADO", "FECHA DE VISITA", "PERSONAS VISITADAS", "HORA DE VISITA", "DURACION"]
+SHEET_MAX_ROWS = 1_048_575  # filas de datos por hoja (más la de títulos)
+_EXCEL_EPOCH = np.datetime64("1899-12-30")
+
+
+def synthetic_frame(rows, seed=0, noise=0.01):
+    """Filas crudas de la hoja (columnas A-H) en orden de envío del formulario."""
+    rng = np.random.default_rng(seed)
+
+    # Pocos centros concentran muchas visitas, como en los datos reales
+    n_centros = max(50, int(rows ** 0.5))
+    centros = np.array([f"CENTRO {i:04d}" for i in range(n_centros)], dtype=object)
+    centro_p = 1 / np.arange(1, n_centros + 1) ** 0.8
+    persona_p = rng.dirichlet(np.full(len(PERSONS), 4.0))
+    hora_p = np.exp(-0.5 * ((np.arange(len(HORA_ORDER)) - 4) / 2.5) ** 2)
+    dur_p = np.array([3, 10, 6, 8, 3, 3, 2, 1], dtype=float)[:len(DUR_ORDER)]
+
+    start = np.datetime64(f"{YEARS[0]}-01-01")
+    days = (np.datetime64(f"{YEARS[-1]}-07-01") - start).astype(int)
+    fecha = np.sort(start + rng.integers(0, days, rows).astype("timedelta64[D]"))
+    # Marca del formulario: hasta tres días después de la visita
+    marca = fecha.astype("datetime64[ms]") + rng.integers(0, 3 * 86_400_000, rows).astype("timedelta64[ms]")
+
+    df = pd.DataFrame({
+        HEADER[0]: marca,
+        HEADER[1]: "",
+        HEADER[2]: _choice(rng, np.array(PERSONS, dtype=object), persona_p, rows),
+        HEADER[3]: _choice(rng, centros, centro_p, rows),
+        HEADER[4]: fecha.astype("datetime64[ns]"),
+        HEADER[5]: "",
+        HEADER[6]: _choice(rng, np.array(HORA_ORDER, dtype=object), hora_p, rows),
+        HEADER[7]: _choice(rng, np.array(DUR_ORDER, dtype=object), dur_p, rows),
+    })
+
+    def pick():
+        return rng.random(rows) < noise / 4
+
+    df.loc[pick(), HEADER[2]] = df[HEADER[2]].str.lower() + " "
+    df.loc[pick(), HEADER[3]] = " " + df[HEADER[3]].str.lower()
+    df.loc[pick(), HEADER[2]] = "OTRA PERSONA"
+    df.loc[pick(), HEADER[4]] = pd.Timestamp(f"{YEARS[0] - 1}-06-01")
+    df.loc[pick(), HEADER[7]] = None
+    return df
+
+
+def _choice(rng, values, p, rows):
+    return values[rng.choice(len(values), rows, p=p / p.sum())]
+
+
+# ── ESCRITURA .XLSX ───────────────────────────────────────────────────────────
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">\
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>\
+<Default Extension="xml" ContentType="application/xml"/>\
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>\
+<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>\
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>\
+<Override PartName="/xl/sharedStrings.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>\
+</Types>"""
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>\
+</Relationships>"""
+
+_WORKBOOK = f"""<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" \
+xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">\
+<sheets><sheet name="{SHEET_NAME}" sheetId="1" r:id="rId1"/></sheets></workbook>"""
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">\
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>\
+<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>\
+<Relationship Id="rId3" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/sharedStrings" Target="sharedStrings.xml"/>\
+</Relationships>"""
+
+# Estilo 1: fecha y hora (formato integrado 22); estilo 2: fecha (formato 14)
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">\
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>\
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>\
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>\
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>\
+<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>\
+<xf numFmtId="22" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>\
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>\
+<cellStyles count="1"><cellStyle name="Normal" xfId="0" builtinId="0"/></cellStyles>\
+</styleSheet>"""
+
+
+def write_workbooks(df, directory, sheet_rows=SHEET_MAX_ROWS):
+    """Guarda ``df`` en ``directory/visitas_000.xlsx``, ``_001``... y devuelve las rutas."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i, lo in enumerate(range(0, max(len(df), 1), sheet_rows)):
+        path = directory / f"visitas_{i:03d}.xlsx"
+        write_workbook(df.iloc[lo:lo + sheet_rows], path)
+        paths.append(path)
+    return paths
+
+
+def write_workbook(df, path):
+    """Libro de una hoja "Datos" con cadenas compartidas y fechas con formato."""
+    strings = pd.Index([])
+    columns = []
+    for name in HEADER:
+        col = df[name]
+        if pd.api.types.is_datetime64_any_dtype(col):
+            serial = (col.to_numpy() - _EXCEL_EPOCH) / np.timedelta64(1, "D")
+            style = 1 if name == HEADER[0] else 2
+            columns.append(("d", style, [None if v != v else repr(v) for v in serial.tolist()]))
+        else:
+            codes, uniques = pd.factorize(col.mask(col == ""))
+            offset = len(strings)
+            strings = strings.append(pd.Index(uniques))
+            columns.append(("s", 0, [None if c < 0 else str(c + offset) for c in codes.tolist()]))
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("[Content_Types].xml", _CONTENT_TYPES)
+        zf.writestr("_rels/.rels", _ROOT_RELS)
+        zf.writestr("xl/workbook.xml", _WORKBOOK)
+        zf.writestr("xl/_rels/workbook.xml.rels", _WORKBOOK_RELS)
+        zf.writestr("xl/styles.xml", _STYLES)
+        header_ids = range(len(strings), len(strings) + len(HEADER))
+        sst = "".join(f"<si><t>{escape(str(s))}</t></si>" for s in [*strings, *HEADER])
+        zf.writestr("xl/sharedStrings.xml",
+                    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                    '<sst xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+                    f'count="{len(strings) + len(HEADER)}" uniqueCount="{len(strings) + len(HEADER)}">{sst}</sst>')
+        with zf.open("xl/worksheets/sheet1.xml", "w") as f:
+            f.write(_sheet_xml_head(len(df)).encode())
+            letters = [chr(ord("A") + i) for i in range(len(HEADER))]
+            cells = "".join(f'<c r="{c}1" t="s"><v>{s}</v></c>' for c, s in zip(letters, header_ids))
+            f.write(f'<row r="1">{cells}</row>'.encode())
+            for r, values in enumerate(zip(*(vals for _, _, vals in columns)), start=2):
+                cells = []
+                for letter, (kind, style, _), v in zip(letters, columns, values):
+                    if v is None:
+                        continue
+                    if kind == "s":
+                        cells.append(f'<c r="{letter}{r}" t="s"><v>{v}</v></c>')
+                    else:
+                        cells.append(f'<c r="{letter}{r}" s="{style}"><v>{v}</v></c>')
+                f.write(f'<row r="{r}">{"".join(cells)}</row>'.encode())
+            f.write(b"</sheetData></worksheet>")
+
+
+def _sheet_xml_head(rows):
+    return ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+            '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+            f'<dimension ref="A1:{chr(ord("A") + len(HEADER) - 1)}{rows + 1}"/><sheetData>')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=int)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    for path in write_workbooks(synthetic_frame(args.rows, args.seed), args.directory):
+        print(path)
+
+
+if __name__ == "__main__":
+    main()
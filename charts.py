@@ -0,0 +1,431 @@
+"""Construcción de las gráficas del dashboard.
+
+Cada función recibe el ``Dataset`` compartido y los filtros activos, agrega
+sobre el cubo y devuelve la ``go.Figure`` (o ``None`` si no hay nada que
+dibujar). No llaman a Streamlit: ``app.py`` decide dónde se muestran y las
+pasa por la caché de figuras (ver figcache.py). La agregación y la
+construcción de la figura se miden por separado (ver perf.py).
+"""
+
+import plotly.graph_objects as go
+
+from config import DUR_ORDER, HORA_ORDER, MAX_TIME_POINTS, PERSONS, SCATTERGL_POINTS
+from dataset import bucket_labels, granularity_for, months_for, rebucket, years_for
+from perf import span
+
+PERSON_COLORS = {
+    "ANGELS":"#6366f1","ARANTXA":"#f59e0b","CRISTINA":"#10b981","Mª JOSÉ":"#3b82f6",
+    "MONTSERRAT":"#ec4899","NURIA":"#8b5cf6","SARA":"#14b8a6","VANESA":"#f97316","EMMA":"#64748b"
+}
+DUR_COLORS = ["#c7d2fe","#a5b4fc","#818cf8","#6366f1","#4f46e5","#4338ca","#3730a3","#312e81"]
+YEAR_COLORS = {2023:"#e2e8f0",2024:"#a5b4fc",2025:"#6366f1",2026:"#312e81"}
+
+
+# Título del eje X cuando los meses se agrupan (ver dataset.granularity_for)
+BUCKET_TITLES = {
+    "quarter": "Trimestres · acota 🗓 Meses para ver cada mes",
+    "year": "Años · acota 🗓 Meses para ver cada mes",
+}
+
+
+def time_axis(granularity, **kwargs):
+    axis = dict(tickangle=-45, **kwargs)
+    if granularity in BUCKET_TITLES:
+        axis["title"] = BUCKET_TITLES[granularity]
+    return axis
+
+
+def active_persons(filters):
+    return [p for p in PERSONS if p in filters.personas] or PERSONS
+
+
+# ── VISIÓN GENERAL ────────────────────────────────────────────────────────────
+def year_chart(dataset, filters):
+    with span("aggregate"):
+        cube = dataset.cube
+        # Calcular visitas por año (sin filtro de año ni meses para esta gráfica)
+        year_totals = cube.counts("year", cube.select(filters.without_dates())).reset_index()
+
+        # Colorear barras: seleccionadas en morado fuerte, resto en gris
+        year_totals["color"] = year_totals["year"].apply(
+            lambda y: "#6366f1" if y in filters.years else "#cbd5e1"
+        )
+        year_totals["year"] = year_totals["year"].astype(str)  # eje categórico, clic devuelve "2024"
+
+    with span("figure"):
+        fig_year = go.Figure(go.Bar(
+            x=year_totals["year"],
+            y=year_totals["visitas"],
+            marker_color=year_totals["color"],
+            text=year_totals["visitas"],
+            textposition="outside",
+            textfont=dict(size=14, weight=700),
+            hovertemplate="<b>%{x}</b><br>%{y} visitas<extra></extra>",
+        ))
+
+        fig_year.update_layout(
+            height=280,
+            margin=dict(t=30, b=40, l=40, r=20),
+            xaxis=dict(title="Año", tickfont=dict(size=13)),
+            yaxis=dict(title="Visitas"),
+            showlegend=False,
+            plot_bgcolor="white",
+            hovermode="x unified",
+        )
+    return fig_year
+
+
+def monthly_chart(dataset, filters, max_points=MAX_TIME_POINTS):
+    with span("aggregate"):
+        cube = dataset.cube
+        monthly = cube.counts("ym", cube.select(filters))
+        if monthly.empty:
+            return None
+        # Con mucho histórico, trimestres o años: tamaño de la figura acotado
+        granularity = granularity_for(monthly.index, max_points)
+        monthly = rebucket(monthly, granularity).reset_index()
+        monthly["mes_label"] = bucket_labels(monthly["ym"], granularity)
+
+        max_m = monthly["visitas"].max()
+        monthly["color"] = monthly["visitas"].apply(lambda v: "#6366f1" if v == max_m else "#c7d2fe")
+
+    with span("figure"):
+        fig = go.Figure(go.Bar(
+            x=monthly["mes_label"],
+            y=monthly["visitas"],
+            marker_color=monthly["color"],
+            text=monthly["visitas"],
+            textposition="outside",
+            textfont=dict(size=10),
+        ))
+        fig.update_layout(
+            height=300,
+            margin=dict(t=30, b=80, l=40, r=20),
+            xaxis=time_axis(granularity, tickfont=dict(size=10)),
+            yaxis=dict(title="Visitas"),
+            showlegend=False,
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+def person_chart(dataset, filters):
+    with span("aggregate"):
+        cube = dataset.cube
+        person_df = (cube.counts("persona", cube.select(filters))
+                       .reindex(active_persons(filters), fill_value=0)
+                       .reset_index(name="visitas")
+                       .sort_values("visitas", ascending=True))
+        person_df = person_df[person_df["visitas"] > 0]
+        if person_df.empty:
+            return None
+
+        person_df["color"] = person_df["persona"].map(PERSON_COLORS)
+
+    with span("figure"):
+        fig = go.Figure(go.Bar(
+            x=person_df["visitas"],
+            y=person_df["persona"],
+            orientation="h",
+            marker_color=person_df["color"],
+            text=person_df["visitas"],
+            textposition="outside",
+            textfont=dict(size=12),
+        ))
+        fig.update_layout(
+            height=max(250, len(person_df) * 40),
+            margin=dict(t=20, b=20, l=100, r=60),
+            xaxis=dict(title="Visitas"),
+            yaxis=dict(tickfont=dict(size=12)),
+            showlegend=False,
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+# ── CENTROS ───────────────────────────────────────────────────────────────────
+def centro_chart(dataset, filters, top_n, page=0, query=""):
+    with span("aggregate"):
+        # Ranking precalculado al cargar (ver dataset.CentroRanking); la
+        # página ``page`` son los puestos page·top_n .. (page+1)·top_n
+        ranking = dataset.centro_ranking
+        codes = ranking.search(query) if query else None
+        top = ranking.top(filters, page * top_n, (page + 1) * top_n, codes)
+        if top.empty:
+            return None
+        centro_df = top.iloc[::-1].reset_index(name="visitas")
+
+        # Colores respecto al primero del ranking, iguales en todas las páginas
+        max_c = ranking.top(filters, 0, 1, codes).iloc[0]
+
+        def get_color(v):
+            if v >= max_c * 0.75: return "#6366f1"
+            elif v >= max_c * 0.5: return "#818cf8"
+            elif v >= max_c * 0.25: return "#a5b4fc"
+            return "#c7d2fe"
+
+        centro_df["color"] = centro_df["visitas"].apply(get_color)
+
+    with span("figure"):
+        fig = go.Figure(go.Bar(
+            x=centro_df["visitas"],
+            y=centro_df["centro"],
+            orientation="h",
+            marker_color=centro_df["color"],
+            text=centro_df["visitas"],
+            textposition="outside",
+            textfont=dict(size=11),
+        ))
+        fig.update_layout(
+            height=max(400, len(centro_df) * 28),
+            margin=dict(t=20, b=20, l=200, r=70),
+            xaxis=dict(title="Visitas", showgrid=True, gridcolor="#f1f5f9"),
+            yaxis=dict(tickfont=dict(size=11)),
+            showlegend=False,
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+# ── DETALLE DE CENTRO ─────────────────────────────────────────────────────────
+# Todo el histórico del centro, desde los recuentos precalculados al cargar
+# (ver dataset.CentroIndex): no dependen de los filtros.
+def centro_month_chart(dataset, filters, centro, max_points=MAX_TIME_POINTS):
+    with span("aggregate"):
+        monthly = dataset.centro_index.profile(centro, "ym")
+        monthly = monthly[monthly > 0]
+        if monthly.empty:
+            return None
+        granularity = granularity_for(monthly.index, max_points)
+        monthly = rebucket(monthly, granularity)
+
+    with span("figure"):
+        fig = go.Figure(go.Bar(
+            x=bucket_labels(monthly.index, granularity),
+            y=monthly.to_numpy(),
+            marker_color="#6366f1",
+            text=monthly.to_numpy(),
+            textposition="outside",
+            textfont=dict(size=10),
+        ))
+        fig.update_layout(
+            height=260,
+            margin=dict(t=30, b=70, l=40, r=20),
+            xaxis=time_axis(granularity, tickfont=dict(size=10)),
+            yaxis=dict(title="Visitas"),
+            showlegend=False,
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+def centro_breakdown_chart(dataset, filters, centro, dim):
+    """Visitas del centro por consultora (de más a menos), duración u hora (en su orden)."""
+    with span("aggregate"):
+        counts = dataset.centro_index.profile(centro, dim)
+        counts = counts[counts > 0]
+        if counts.empty:
+            return None
+        if dim == "persona":
+            counts = counts.sort_values(ascending=False, kind="stable")
+            colors = [PERSON_COLORS.get(p, "#818cf8") for p in counts.index]
+        else:
+            colors = "#818cf8"
+
+    with span("figure"):
+        fig = go.Figure(go.Bar(
+            x=counts.to_numpy(),
+            y=list(counts.index),
+            orientation="h",
+            marker_color=colors,
+            text=counts.to_numpy(),
+            textposition="outside",
+            textfont=dict(size=11),
+        ))
+        fig.update_layout(
+            height=max(200, len(counts) * 32),
+            margin=dict(t=10, b=20, l=90, r=50),
+            xaxis=dict(title="Visitas"),
+            yaxis=dict(autorange="reversed", tickfont=dict(size=11)),
+            showlegend=False,
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+# ── EVOLUCIÓN ─────────────────────────────────────────────────────────────────
+def _evolution_frame(dataset, filters, max_points):
+    # Matriz densa mes × consultora precalculada al cargar (ver dataset.py),
+    # agrupada por trimestre o año si hay más meses que ``max_points``
+    df_evol = months_for(dataset, active_persons(filters), filters)
+    granularity = granularity_for(df_evol.index, max_points)
+    df_evol = rebucket(df_evol, granularity).reset_index()
+    df_evol["label"] = bucket_labels(df_evol["ym"], granularity)
+    return df_evol, granularity
+
+
+def evolution_line_chart(dataset, filters, max_points=MAX_TIME_POINTS):
+    with span("aggregate"):
+        df_evol, granularity = _evolution_frame(dataset, filters, max_points)
+        if df_evol.empty:
+            return None
+
+    with span("figure"):
+        fig = go.Figure()
+        persons = active_persons(filters)
+        # Muchos puntos: WebGL dibuja bastante más rápido que SVG
+        scatter = go.Scattergl if len(df_evol) * len(persons) > SCATTERGL_POINTS else go.Scatter
+        for p in persons:
+            fig.add_trace(scatter(
+                x=df_evol["label"],
+                y=df_evol[p],
+                mode="lines+markers",
+                name=p,
+                line=dict(color=PERSON_COLORS[p], width=2),
+                marker=dict(size=4),
+            ))
+        fig.update_layout(
+            height=350,
+            margin=dict(t=20, b=80, l=40, r=20),
+            xaxis=time_axis(granularity, tickfont=dict(size=9)),
+            yaxis=dict(title="Visitas"),
+            legend=dict(orientation="h", yanchor="bottom", y=1.02),
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+def evolution_stack_chart(dataset, filters, max_points=MAX_TIME_POINTS):
+    with span("aggregate"):
+        df_evol, granularity = _evolution_frame(dataset, filters, max_points)
+        if df_evol.empty:
+            return None
+
+    with span("figure"):
+        fig = go.Figure()
+        for p in active_persons(filters):
+            fig.add_trace(go.Bar(
+                x=df_evol["label"],
+                y=df_evol[p],
+                name=p,
+                marker_color=PERSON_COLORS[p],
+            ))
+        fig.update_layout(
+            barmode="stack",
+            height=350,
+            margin=dict(t=20, b=80, l=40, r=20),
+            xaxis=time_axis(granularity, tickfont=dict(size=9)),
+            yaxis=dict(title="Visitas"),
+            legend=dict(orientation="h", yanchor="bottom", y=1.02),
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+def annual_chart(dataset, filters):
+    with span("aggregate"):
+        df_comp = years_for(dataset, active_persons(filters), filters).reset_index()
+        if df_comp.empty:
+            return None
+
+    with span("figure"):
+        fig = go.Figure()
+        for yr, color in YEAR_COLORS.items():
+            if yr in df_comp.columns:
+                fig.add_trace(go.Bar(
+                    x=df_comp["persona"],
+                    y=df_comp[yr],
+                    name=str(yr),
+                    marker_color=color,
+                    text=df_comp[yr],
+                    textposition="outside",
+                    textfont=dict(size=9),
+                ))
+        fig.update_layout(
+            barmode="group",
+            height=350,
+            margin=dict(t=30, b=40, l=40, r=20),
+            xaxis=dict(tickfont=dict(size=11)),
+            yaxis=dict(title="Visitas"),
+            legend=dict(orientation="h", yanchor="bottom", y=1.02),
+            plot_bgcolor="white",
+        )
+    return fig
+
+
+# ── DURACIÓN & HORA ───────────────────────────────────────────────────────────
+def duration_chart(dataset, filters):
+    with span("aggregate"):
+        cube = dataset.cube
+        dur_df = (cube.counts("duracion", cube.select(filters))
+                    .reindex(DUR_ORDER, fill_value=0)
+                    .reset_index())
+        dur_df.columns = ["duracion", "visitas"]
+        dur_df = dur_df[dur_df["visitas"] > 0]
+        if dur_df.empty:
+            return None
+
+        dur_df["color"] = [DUR_COLORS[i] for i in range(len(dur_df))]
+
+    with span("figure"):
+        fig = go.Figure(go.Pie(
+            labels=dur_df["duracion"],
+            values=dur_df["visitas"],
+            marker_colors=dur_df["color"],
+            textinfo="percent+label",
+            textfont=dict(size=11),
+            hovertemplate="<b>%{label}</b><br>%{value} visitas<br>%{percent}<extra></extra>",
+        ))
+        fig.update_layout(
+            height=400,
+            margin=dict(t=20, b=20, l=20, r=20),
+            showlegend=True,
+            legend=dict(font=dict(size=10)),
+        )
+    return fig
+
+
+def hour_chart(dataset, filters):
+    with span("aggregate"):
+        cube = dataset.cube
+        hora_df = (cube.counts("hora", cube.select(filters))
+                     .reindex(HORA_ORDER, fill_value=0)
+                     .reset_index())
+        hora_df.columns = ["hora", "visitas"]
+        hora_df = hora_df[hora_df["visitas"] > 0]
+        if hora_df.empty:
+            return None
+
+        max_h = hora_df["visitas"].max()
+
+        def get_hora_color(v):
+            if v == max_h: return "#6366f1"
+            elif v >= max_h * 0.7: return "#818cf8"
+            elif v >= max_h * 0.4: return "#a5b4fc"
+            return "#c7d2fe"
+
+        hora_df["color"] = hora_df["visitas"].apply(get_hora_color)
+
+    with span("figure"):
+        fig = go.Figure(go.Bar(
+            x=hora_df["visitas"],
+            y=hora_df["hora"],
+            orientation="h",
+            marker_color=hora_df["color"],
+            text=hora_df["visitas"],
+            textposition="outside",
+            textfont=dict(size=11),
+        ))
+        fig.update_layout(
+            height=400,
+            margin=dict(t=20, b=20, l=50, r=60),
+            xaxis=dict(title="Visitas", showgrid=True, gridcolor="#f1f5f9"),
+            yaxis=dict(
+                categoryorder="array",
+                categoryarray=HORA_ORDER,
+                tickfont=dict(size=12),
+            ),
+            showlegend=False,
+            plot_bgcolor="white",
+        )
+    return fig
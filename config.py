@@ -0,0 +1,57 @@
+"""Constantes compartidas por el dashboard y la capa de datos."""
+
+import os
+from pathlib import Path
+
+PERSONS = ["ANGELS","ARANTXA","CRISTINA","Mª JOSÉ","MONTSERRAT","NURIA","SARA","VANESA","EMMA"]
+DUR_ORDER = ["30 m","1 h","1h30","2 h","2h30","3 h","4 h","8 h"]
+HORA_ORDER = ["7h","8h","9h","10h","11h","12h","13h","14h","15h","16h","17h"]
+YEARS = [2023, 2024, 2025, 2026]
+MESES = {"01":"Ene","02":"Feb","03":"Mar","04":"Abr","05":"May","06":"Jun",
+         "07":"Jul","08":"Ago","09":"Sep","10":"Oct","11":"Nov","12":"Dic"}
+
+EXCEL_PATH = Path(__file__).parent / "visitas_FROCA.xlsx"
+SHEET_NAME = "Datos"
+
+# Origen de los datos (ver sources.py): un libro, una carpeta con varios .xlsx
+# o un patrón glob ("datos/visitas_*.xlsx"). De cada libro se leen las hojas
+# cuyo nombre encaja con algún patrón de SHEETS (["*"] = todas, p. ej. una
+# hoja por consultora). Los libros/hojas se leen en paralelo en LOAD_WORKERS
+# procesos (None = uno por núcleo). FROCA_DATA_SOURCE lo sustituye sin tocar
+# este fichero (p. ej. datos sintéticos de bench/).
+DATA_SOURCE = os.environ.get("FROCA_DATA_SOURCE", EXCEL_PATH)
+SHEETS = [SHEET_NAME]
+LOAD_WORKERS = None
+# Columnas usadas de la hoja (A, C, D, E, G, H) y filas por lote en la lectura.
+# El lote es también la unidad de la lectura incremental (ver sheetscan.py).
+USECOLS = [0, 2, 3, 4, 6, 7]
+INGEST_BATCH_ROWS = 5_000
+
+# Cada cuántos segundos comprueba el hilo de fondo si el Excel ha cambiado
+REFRESH_INTERVAL = 30
+
+# Límites de la caché LRU de figuras serializadas (ver figcache.py)
+FIGURE_CACHE_ENTRIES = 256
+FIGURE_CACHE_BYTES = 64 * 1024 * 1024
+
+# Gráficas por mes (Visitas por Mes y Evolución): como mucho MAX_TIME_POINTS
+# barras/puntos por serie (MAX_TIME_POINTS_MOBILE en el móvil); si el rango
+# tiene más meses se agrupan por trimestre o año (ver dataset.py). Las líneas
+# pasan a WebGL (Scattergl) a partir de SCATTERGL_POINTS puntos en total.
+MAX_TIME_POINTS = 48
+MAX_TIME_POINTS_MOBILE = 24
+SCATTERGL_POINTS = 500
+
+# Exportación (ver exports.py): filas por tramo y exportaciones simultáneas
+EXPORT_CHUNK_ROWS = 50_000
+EXPORT_WORKERS = 1
+
+# Presupuesto de la primera pintura de cada sesión (ver warmup.py): si la
+# primera ejecución completa de la app tarda más, se avisa en el log
+FIRST_PAINT_BUDGET_MS = 2_000
+
+# Log de tiempos por ejecución (ver perf.py); None lo desactiva. Al superar
+# PERF_LOG_MAX_BYTES se rota a "perf.jsonl.1". FROCA_PERF_LOG lo lleva a otro
+# fichero (la prueba de carga de bench/ escribe el suyo aparte).
+PERF_LOG = Path(os.environ.get("FROCA_PERF_LOG", Path(__file__).parent / "perf.jsonl"))
+PERF_LOG_MAX_BYTES = 5 * 1024 * 1024
@@ -0,0 +1,520 @@
+"""Conjunto de datos en memoria y cubo de recuentos compartido por las pestañas.
+
+Las pestañas no recorren las visitas fila a fila: todas las gráficas y KPIs
+se obtienen filtrando y sumando el cubo, que tiene una fila por combinación
+distinta de (año, mes, consultora, centro, duración, hora). Su tamaño depende
+del número de combinaciones, no del número de visitas.
+
+Las dimensiones son enteros (``year``, ``ym``) o categóricas con categorías
+fijas, así que filtrar y agrupar trabaja siempre sobre códigos enteros.
+
+Hay un único ``Dataset`` por proceso (lo mantiene ``refresher.py``) y todos
+sus arrays son de solo lectura: las sesiones lo comparten sin copiarlo y
+trabajan con arrays de posiciones de filas, nunca con copias de las tablas.
+"""
+
+import unicodedata
+from dataclasses import dataclass, replace
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from config import MESES, PERSONS, YEARS
+
+CUBE_DIMS = ["year", "ym", "persona", "centro", "duracion", "hora"]
+
+# Etiqueta "Ene 24" de cada mes, indexada por ``ym - YM_BASE``
+YM_BASE = YEARS[0] * 12
+MONTH_LABELS = np.array([f"{mes} {year % 100:02d}" for year in YEARS for mes in MESES.values()])
+
+
+@dataclass(frozen=True)
+class Filters:
+    """Estado de los filtros. Una tupla vacía significa "todos"."""
+    years: tuple = ()
+    personas: tuple = ()
+    centros: tuple = ()
+    ym_from: int | None = None
+    ym_to: int | None = None
+
+    def without_dates(self):
+        """Los mismos filtros sin año ni rango de meses (gráficas por año)."""
+        return replace(self, years=(), ym_from=None, ym_to=None)
+
+
+@dataclass(frozen=True)
+class Dataset:
+    df: pd.DataFrame
+    cube: "Cube"
+    month_person: pd.DataFrame
+    year_person: pd.DataFrame
+    prefix: "PrefixCounts"
+    centro_ranking: "CentroRanking"
+    centro_index: "CentroIndex"
+    version: int
+    loaded_at: datetime
+    last_date: pd.Timestamp
+
+
+def build_dataset(df, version):
+    cube = Cube(build_cube(df))
+    return Dataset(
+        df=freeze_frame(df),
+        cube=cube,
+        month_person=freeze_frame(build_month_person(cube.frame)),
+        year_person=freeze_frame(build_year_person(cube.frame)),
+        prefix=PrefixCounts(cube),
+        centro_ranking=CentroRanking(cube),
+        centro_index=CentroIndex(df, cube),
+        version=version,
+        loaded_at=datetime.now(),
+        last_date=df["fecha"].max(),
+    )
+
+
+def month_labels(ym):
+    return MONTH_LABELS[np.asarray(ym) - YM_BASE]
+
+
+# ── AGRUPACIÓN TEMPORAL ───────────────────────────────────────────────────────
+# Meses por cubeta de cada agrupación, de la más fina a la más gruesa. El cubo
+# llega hasta el mes: no hay agrupación más fina.
+GRANULARITY_MONTHS = {"month": 1, "quarter": 3, "year": 12}
+
+
+def granularity_for(ym, max_points):
+    """Agrupación más fina que deja como mucho ``max_points`` cubetas entre los meses ``ym``."""
+    ym = np.asarray(ym)
+    n_months = int(ym.max() - ym.min() + 1) if len(ym) else 0
+    for granularity, months in GRANULARITY_MONTHS.items():
+        if -(-n_months // months) <= max_points:
+            break
+    return granularity
+
+
+def rebucket(frame, granularity):
+    """Suma las filas de ``frame`` (índice ``ym``) por cubeta; el índice pasa a
+    ser el primer mes de cada cubeta."""
+    months = GRANULARITY_MONTHS[granularity]
+    if months == 1:
+        return frame
+    ym = frame.index.to_numpy()
+    return frame.groupby(ym - ym % months).sum().rename_axis("ym")
+
+
+def bucket_labels(ym, granularity):
+    """Etiquetas "Ene 24", "T1 24" o "2024" según la agrupación."""
+    ym = np.asarray(ym)
+    if granularity == "month":
+        return month_labels(ym)
+    if granularity == "quarter":
+        return np.array([f"T{m % 12 // 3 + 1} {m // 12 % 100:02d}" for m in ym.tolist()])
+    return (ym // 12).astype(str)
+
+
+def _readonly(arr):
+    arr = np.array(arr, copy=True)
+    arr.flags.writeable = False
+    return arr
+
+
+def freeze_frame(df):
+    """Copia de ``df`` cuyos arrays no se pueden modificar.
+
+    Cada columna conserva su propio array (``copy=False``) para que pandas no
+    los consolide en bloques nuevos, que volverían a ser escribibles.
+    """
+    if len(set(df.dtypes.astype(str))) == 1 and not isinstance(df.dtypes.iloc[0], pd.CategoricalDtype):
+        # Matriz homogénea: un único bloque 2D
+        return pd.DataFrame(_readonly(df.to_numpy()), index=df.index, columns=df.columns, copy=False)
+    cols = {}
+    for name, col in df.items():
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            cols[name] = pd.Categorical.from_codes(_readonly(col.cat.codes), dtype=col.dtype)
+        else:
+            cols[name] = _readonly(col.to_numpy())
+    return pd.DataFrame(cols, index=df.index, copy=False)
+
+
+# ── CUBO ──────────────────────────────────────────────────────────────────────
+def build_cube(df):
+    return (df.groupby(CUBE_DIMS, dropna=False, observed=True, sort=True)
+              .size()
+              .reset_index(name="visitas"))
+
+
+class PostingIndex:
+    """Posiciones ordenadas de las filas que tienen cada código de una dimensión.
+
+    Se construye una vez por carga; la unión de varios valores es la unión de
+    sus listas, que son disjuntas y ya están ordenadas.
+    """
+
+    def __init__(self, codes, n_labels):
+        order = np.argsort(codes, kind="stable")
+        self._order = _readonly(order)
+        self._bounds = np.searchsorted(codes[order], np.arange(n_labels + 1))
+
+    def positions(self, codes):
+        parts = [self._order[self._bounds[c]:self._bounds[c + 1]] for c in codes]
+        if len(parts) == 1:
+            return parts[0]
+        return np.sort(np.concatenate(parts)) if parts else np.empty(0, dtype=self._order.dtype)
+
+
+class Cube:
+    """Cubo de recuentos con sus dimensiones codificadas como enteros.
+
+    Las filas están ordenadas por mes, así que un rango de meses es un tramo
+    contiguo. Para el resto de filtros hay una ``PostingIndex`` por dimensión
+    y cualquier combinación se resuelve intersecando listas de posiciones.
+    Las selecciones son arrays de posiciones (``None`` = todas) y las sumas
+    se hacen con ``np.bincount`` sobre los códigos.
+    """
+
+    INDEXED_DIMS = {"years": "year", "personas": "persona", "centros": "centro"}
+
+    def __init__(self, frame):
+        self.frame = freeze_frame(frame.sort_values("ym", kind="stable", ignore_index=True))
+        self.visitas = self.frame["visitas"].to_numpy()
+        self._ym = self.frame["ym"].to_numpy()
+        self._codes = {}
+        self._labels = {}
+        for dim in CUBE_DIMS:
+            col = self.frame[dim]
+            if isinstance(col.dtype, pd.CategoricalDtype):
+                codes, labels = col.cat.codes.to_numpy(), col.cat.categories
+            else:
+                labels = pd.Index(np.unique(col.to_numpy()))
+                codes = _readonly(labels.get_indexer(col.to_numpy()))
+            self._codes[dim] = codes
+            self._labels[dim] = labels
+        self._index = {dim: PostingIndex(self._codes[dim], len(self._labels[dim]))
+                       for dim in self.INDEXED_DIMS.values()}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def labels(self, dim):
+        """Valores de la dimensión presentes en el cubo."""
+        return self._labels[dim][np.unique(self._codes[dim][self._codes[dim] >= 0])]
+
+    def select(self, filters):
+        """Posiciones de las filas que cumplen ``filters`` (``None`` = todas)."""
+        sets = []
+        for field, dim in self.INDEXED_DIMS.items():
+            values = getattr(filters, field)
+            if values:
+                codes = self._labels[dim].get_indexer(list(values))
+                sets.append(self._index[dim].positions(codes[codes >= 0]))
+        lo, hi = 0, len(self)
+        if filters.ym_from is not None:
+            lo = np.searchsorted(self._ym, filters.ym_from, side="left")
+        if filters.ym_to is not None:
+            hi = np.searchsorted(self._ym, filters.ym_to, side="right")
+
+        if not sets:
+            return None if (lo, hi) == (0, len(self)) else np.arange(lo, hi)
+        sets.sort(key=len)
+        rows = sets[0]
+        for other in sets[1:]:
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        # Las posiciones están ordenadas: el rango de meses es un recorte
+        return rows[np.searchsorted(rows, lo):np.searchsorted(rows, hi)]
+
+    def total(self, rows=None):
+        return int(self.visitas.sum() if rows is None else self.visitas[rows].sum())
+
+    def counts(self, dim, rows=None):
+        """Visitas por valor de ``dim`` (solo valores con visitas, en orden)."""
+        codes, weights = self._codes[dim], self.visitas
+        if rows is not None:
+            codes, weights = codes[rows], weights[rows]
+        valid = codes >= 0
+        sums = np.bincount(codes[valid], weights=weights[valid],
+                           minlength=len(self._labels[dim])).astype(np.int64)
+        nonzero = np.flatnonzero(sums)
+        return pd.Series(sums[nonzero], index=pd.Index(np.asarray(self._labels[dim])[nonzero], name=dim),
+                         name="visitas")
+
+    def crosstab(self, row_dim, col_dim, rows=None):
+        """Matriz densa ``row_dim`` × ``col_dim`` con todos los valores del cubo."""
+        a, b, weights = self._codes[row_dim], self._codes[col_dim], self.visitas
+        if rows is not None:
+            a, b, weights = a[rows], b[rows], weights[rows]
+        n_a, n_b = len(self._labels[row_dim]), len(self._labels[col_dim])
+        valid = (a >= 0) & (b >= 0)
+        # Los códigos categóricos pueden ser int8: se amplían antes de combinarlos
+        key = a[valid].astype(np.int64) * n_b + b[valid]
+        flat = np.bincount(key, weights=weights[valid], minlength=n_a * n_b)
+        return pd.DataFrame(flat.astype(np.int64).reshape(n_a, n_b),
+                            index=pd.Index(np.asarray(self._labels[row_dim]), name=row_dim),
+                            columns=np.asarray(self._labels[col_dim]))
+
+
+def counts(cube, by):
+    """Visitas sumadas por una o varias dimensiones de un cubo en DataFrame."""
+    return cube.groupby(by, observed=True, sort=True)["visitas"].sum()
+
+
+# ── SUMAS ACUMULADAS POR MES ──────────────────────────────────────────────────
+def _prefix(matrix):
+    """Suma acumulada por filas con una columna inicial de ceros."""
+    out = np.zeros((matrix.shape[0], matrix.shape[1] + 1), dtype=np.int64)
+    np.cumsum(matrix, axis=1, out=out[:, 1:])
+    out.flags.writeable = False
+    return out
+
+
+class PrefixCounts:
+    """Sumas acumuladas mes × (consultora | centro | total).
+
+    Para cada consultora y cada centro se guardan las visitas acumuladas mes
+    a mes y el número acumulado de meses con alguna visita. El total y los
+    meses activos de cualquier ventana salen de dos restas.
+    """
+
+    def __init__(self, cube):
+        months = cube.labels("ym")
+        self.ym0, self.ym1 = int(months.min()), int(months.max())
+        axis = np.arange(self.ym0, self.ym1 + 1)
+        self._labels = {}
+        self._matrix = {}
+        self._visits = {}
+        self._active = {}
+        for dim in ("persona", "centro"):
+            m = cube.crosstab(dim, "ym").reindex(columns=axis, fill_value=0)
+            self._labels[dim] = m.index
+            self._matrix[dim] = _readonly(m.to_numpy())
+            self._visits[dim] = _prefix(self._matrix[dim])
+            self._active[dim] = _prefix(self._matrix[dim] > 0)
+        total = self._matrix["persona"].sum(axis=0, keepdims=True)
+        self._visits["all"] = _prefix(total)
+        self._active["all"] = _prefix(total > 0)
+
+    def window(self, lo, hi, dim=None, values=()):
+        """``(visitas, meses activos)`` de los meses ``lo..hi`` (códigos ``ym``).
+
+        Sin ``values`` se usa la fila de totales. Con un único valor las dos
+        cifras son O(1); con varios, las visitas son O(k) y los meses activos
+        requieren sumar las k filas de la ventana.
+        """
+        lo, hi = max(lo, self.ym0), min(hi, self.ym1)
+        if lo > hi:
+            return 0, 0
+        a, b = lo - self.ym0, hi - self.ym0 + 1
+        if not values:
+            return (int(self._visits["all"][0, b] - self._visits["all"][0, a]),
+                    int(self._active["all"][0, b] - self._active["all"][0, a]))
+        idx = self._labels[dim].get_indexer(list(values))
+        idx = idx[idx >= 0]
+        if len(idx) == 0:
+            return 0, 0
+        visits = int((self._visits[dim][idx, b] - self._visits[dim][idx, a]).sum())
+        if len(idx) == 1:
+            active = int(self._active[dim][idx[0], b] - self._active[dim][idx[0], a])
+        else:
+            active = int((self._matrix[dim][idx, a:b].sum(axis=0) > 0).sum())
+        return visits, active
+
+
+# ── RANKING DE CENTROS ────────────────────────────────────────────────────────
+def normalize_name(text):
+    """Mayúsculas sin acentos ni espacios repetidos, para buscar centros."""
+    text = unicodedata.normalize("NFKD", str(text))
+    return " ".join("".join(ch for ch in text if not unicodedata.combining(ch)).upper().split())
+
+
+class CentroRanking:
+    """Centros ordenados por visitas, precalculados por (año, consultora).
+
+    Para cada año y cada consultora (incluido "todos") se guardan las visitas
+    por centro y su orden de mayor a menor, con los empates por nombre. Con
+    esos filtros una página del ranking es un recorte del orden; con otros
+    (varios valores, rango de meses, centros, búsqueda) se suman los vectores
+    precalculados o se recuenta el cubo y se eligen los primeros con
+    ``argpartition``, sin ordenar todos los centros.
+
+    La búsqueda encuentra los centros con alguna palabra que empieza por el
+    texto buscado (sin distinguir mayúsculas ni acentos): cada nombre se
+    guarda desde cada una de sus palabras en un array ordenado, y un prefijo
+    es un rango de ese array.
+    """
+
+    def __init__(self, cube):
+        self._cube = cube
+        self._years, self._personas = cube._labels["year"], cube._labels["persona"]
+        self.labels = cube._labels["centro"]
+        n_y, n_p, n_c = len(self._years), len(self._personas), len(self.labels)
+
+        y, p, c = (cube._codes[dim] for dim in ("year", "persona", "centro"))
+        valid = (y >= 0) & (p >= 0) & (c >= 0)
+        key = (y[valid].astype(np.int64) * n_p + p[valid]) * n_c + c[valid]
+        flat = np.bincount(key, weights=cube.visitas[valid], minlength=n_y * n_p * n_c)
+        # El último año y la última consultora de cada eje son "todos"
+        counts = np.zeros((n_y + 1, n_p + 1, n_c), dtype=np.int64)
+        counts[:n_y, :n_p] = flat.reshape(n_y, n_p, n_c)
+        counts[n_y, :n_p] = counts[:n_y, :n_p].sum(axis=0)
+        counts[:, n_p] = counts[:, :n_p].sum(axis=1)
+        self._counts = _readonly(counts)
+        self._order = _readonly(np.argsort(-counts, axis=2, kind="stable").astype(np.int32))
+        self._ranked = _readonly((counts > 0).sum(axis=2))
+
+        keys, codes = [], []
+        for code, name in enumerate(map(normalize_name, self.labels)):
+            words = name.split(" ")
+            for i in range(len(words)):
+                keys.append(" ".join(words[i:]))
+                codes.append(code)
+        order = np.argsort(keys, kind="stable")
+        self._search_keys = _readonly(np.array(keys, dtype=str)[order])
+        self._search_codes = _readonly(np.array(codes, dtype=np.int32)[order])
+
+    def search(self, text):
+        """Códigos de los centros con alguna palabra que empieza por ``text``."""
+        prefix = normalize_name(text)
+        lo = np.searchsorted(self._search_keys, prefix, side="left")
+        hi = np.searchsorted(self._search_keys, prefix + "\U0010ffff", side="left")
+        return np.unique(self._search_codes[lo:hi])
+
+    def _slot(self, filters):
+        """(años, consultoras) precalculados que cubren ``filters``, o ``None``."""
+        if filters.centros or filters.ym_from is not None or filters.ym_to is not None:
+            return None
+        years = self._years.get_indexer(list(filters.years)) if filters.years else [len(self._years)]
+        personas = (self._personas.get_indexer(list(filters.personas)) if filters.personas
+                    else [len(self._personas)])
+        return [i for i in years if i >= 0], [i for i in personas if i >= 0]
+
+    def counts(self, filters):
+        """Visitas por código de centro con ``filters``."""
+        slot = self._slot(filters)
+        if slot is None:
+            rows = self._cube.select(filters)
+            codes, weights = self._cube._codes["centro"], self._cube.visitas
+            if rows is not None:
+                codes, weights = codes[rows], weights[rows]
+            valid = codes >= 0
+            return np.bincount(codes[valid], weights=weights[valid],
+                               minlength=len(self.labels)).astype(np.int64)
+        years, personas = slot
+        return self._counts[np.ix_(years, personas)].sum(axis=(0, 1))
+
+    def size(self, filters, codes=None):
+        """Número de centros con alguna visita (entre ``codes`` si se dan)."""
+        slot = self._slot(filters)
+        if codes is None and slot is not None and len(slot[0]) == len(slot[1]) == 1:
+            return int(self._ranked[slot[0][0], slot[1][0]])
+        counts = self.counts(filters)
+        return int(np.count_nonzero(counts if codes is None else counts[codes]))
+
+    def top(self, filters, start, stop, codes=None):
+        """Puestos ``start``..``stop`` del ranking (centro → visitas), de más a menos.
+
+        ``codes`` limita el ranking a esos centros (resultado de ``search``).
+        """
+        slot = self._slot(filters)
+        if codes is None and slot is not None and len(slot[0]) == len(slot[1]) == 1:
+            y, p = slot[0][0], slot[1][0]
+            page = self._order[y, p, start:min(stop, self._ranked[y, p])]
+            return self._series(page, self._counts[y, p, page])
+
+        counts = self.counts(filters)
+        candidates = np.flatnonzero(counts) if codes is None else codes[counts[codes] > 0]
+        # Puntuación única: visitas y, a igualdad, el nombre (códigos ordenados)
+        score = counts[candidates] * len(self.labels) - candidates
+        k = min(stop, len(candidates))
+        best = np.argpartition(-score, k - 1)[:k] if 0 < k < len(candidates) else np.arange(k)
+        page = candidates[best[np.argsort(-score[best])]][start:stop]
+        return self._series(page, counts[page])
+
+    def _series(self, codes, visits):
+        return pd.Series(visits, index=pd.Index(np.asarray(self.labels)[codes], name="centro"),
+                         name="visitas")
+
+
+# ── DETALLE DE CENTRO ─────────────────────────────────────────────────────────
+class CentroIndex:
+    """Visitas de un centro sin recorrer la tabla completa.
+
+    ``rows`` da las posiciones ordenadas de sus visitas en ``Dataset.df``
+    (una ``PostingIndex`` sobre los códigos de centro) y ``profile`` sus
+    visitas por mes, consultora, duración u hora, precalculadas al cargar.
+    Abrir el detalle de un centro cuesta lo que sus visitas, no lo que la
+    tabla.
+    """
+
+    PROFILE_DIMS = ("ym", "persona", "duracion", "hora")
+
+    def __init__(self, df, cube):
+        centro = df["centro"].cat
+        self.labels = centro.categories
+        self._rows = PostingIndex(centro.codes.to_numpy(), len(self.labels))
+        self._profile = {dim: freeze_frame(cube.crosstab("centro", dim)) for dim in self.PROFILE_DIMS}
+
+    def rows(self, centro):
+        """Posiciones de las visitas de ``centro`` (vacío si no existe)."""
+        code = self.labels.get_indexer([centro])[0]
+        return self._rows.positions([code]) if code >= 0 else np.empty(0, dtype=np.intp)
+
+    def profile(self, centro, dim):
+        """Visitas de ``centro`` por cada valor de ``dim`` (también los que no tienen)."""
+        return self._profile[dim].loc[centro]
+
+
+# ── MATRICES DENSAS ───────────────────────────────────────────────────────────
+def build_month_person(cube):
+    """Matriz mes × consultora con todas las consultoras como columnas.
+
+    Índice (year, ym) ordenado por mes. La usan tanto la línea como las
+    barras apiladas de Evolución: filtrar es seleccionar filas/columnas.
+    """
+    return (counts(cube, ["year","ym","persona"])
+              .unstack("persona", fill_value=0)
+              .reindex(columns=PERSONS, fill_value=0)
+              .rename_axis(columns=None))
+
+
+def build_year_person(cube):
+    """Matriz consultora × año para la comparativa anual."""
+    return (counts(cube, ["persona","year"])
+              .unstack("year", fill_value=0)
+              .reindex(index=PERSONS, columns=YEARS, fill_value=0)
+              .rename_axis(index="persona", columns=None))
+
+
+def months_for(dataset, persons, filters):
+    """Matriz mes × consultora (índice ``ym``) para los filtros activos.
+
+    Sin filtro de centro basta con recortar la matriz precalculada; con él
+    se cruza la selección del cubo. Conserva solo los meses con alguna
+    visita de la selección, igual que antes cuando se recorrían los meses
+    presentes en los datos filtrados.
+    """
+    if filters.centros:
+        mp = (dataset.cube.crosstab("ym", "persona", dataset.cube.select(filters))
+                .reindex(columns=PERSONS, fill_value=0))
+    else:
+        mp = dataset.month_person
+        keep = np.ones(len(mp), dtype=bool)
+        if filters.years:
+            keep &= mp.index.get_level_values("year").isin(filters.years)
+        ym = mp.index.get_level_values("ym")
+        if filters.ym_from is not None:
+            keep &= ym >= filters.ym_from
+        if filters.ym_to is not None:
+            keep &= ym <= filters.ym_to
+        mp = mp[keep].droplevel("year")
+    mp = mp[persons]
+    return mp[mp.sum(axis=1) > 0]
+
+
+def years_for(dataset, persons, filters):
+    """Matriz consultora × año de la comparativa anual (sin filtros de fecha)."""
+    if filters.centros:
+        yp = (dataset.cube.crosstab("persona", "year", dataset.cube.select(filters.without_dates()))
+                .reindex(columns=YEARS, fill_value=0))
+    else:
+        yp = dataset.year_person
+    return yp.reindex(index=persons, fill_value=0).rename_axis(index="persona")
@@ -0,0 +1,149 @@
+"""Exportación de las visitas filtradas y de las tablas de cada pestaña.
+
+Las visitas se recorren por tramos de ``EXPORT_CHUNK_ROWS`` filas (o solo las
+de los centros filtrados, ver ``dataset.CentroIndex``) y cada tramo se escribe
+en un fichero temporal en disco, en CSV o Parquet, antes de pasar al
+siguiente: nunca se construye la tabla filtrada completa ni el texto completo
+con ``to_csv()``. Como mucho ``EXPORT_WORKERS`` exportaciones a la vez, para
+que una grande no acapare el proceso que comparten todas las sesiones.
+"""
+
+import tempfile
+import threading
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from charts import active_persons
+from config import EXPORT_CHUNK_ROWS, EXPORT_WORKERS, YEARS
+from dataset import month_labels, months_for, years_for
+
+FORMATS = {"CSV": ("csv", "text/csv"), "Parquet": ("parquet", "application/vnd.apache.parquet")}
+
+# Columnas de las visitas con los títulos de la hoja "Datos"
+VISIT_COLUMNS = {
+    "fecha": "FECHA DE VISITA",
+    "persona": "PERSONA QUE REALIZA LA VISITA",
+    "centro": "CENTRO VISITADO",
+    "hora": "HORA DE VISITA",
+    "duracion": "DURACION",
+    "marca": "Marca de temps",
+}
+
+_slots = threading.BoundedSemaphore(EXPORT_WORKERS)
+
+
+def visit_chunks(dataset, filters, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Visitas que cumplen ``filters``, en tramos de como mucho ``chunk_rows`` filas."""
+    df = dataset.df
+    if filters.centros:
+        rows = np.sort(np.concatenate([dataset.centro_index.rows(c) for c in filters.centros]))
+        parts = (rows[lo:lo + chunk_rows] for lo in range(0, len(rows), chunk_rows))
+    else:
+        parts = (slice(lo, lo + chunk_rows) for lo in range(0, len(df), chunk_rows))
+
+    empty = True
+    for part in parts:
+        chunk = df.iloc[part]
+        keep = np.ones(len(chunk), dtype=bool)
+        if filters.years:
+            keep &= chunk["year"].isin(filters.years).to_numpy()
+        if filters.personas:
+            keep &= chunk["persona"].isin(filters.personas).to_numpy()
+        if filters.ym_from is not None:
+            keep &= chunk["ym"].to_numpy() >= filters.ym_from
+        if filters.ym_to is not None:
+            keep &= chunk["ym"].to_numpy() <= filters.ym_to
+        if keep.any():
+            empty = False
+            yield chunk.loc[keep, list(VISIT_COLUMNS)].rename(columns=VISIT_COLUMNS)
+    if empty:
+        yield df.iloc[:0][list(VISIT_COLUMNS)].rename(columns=VISIT_COLUMNS)
+
+
+# ── TABLAS DE CADA PESTAÑA ────────────────────────────────────────────────────
+# Los mismos recuentos que las gráficas, sobre el cubo (ver dataset.py)
+def _counts(dataset, filters, dim, label):
+    cube = dataset.cube
+    return cube.counts(dim, cube.select(filters)).rename_axis(label).reset_index(name="Visitas")
+
+
+def monthly_table(dataset, filters):
+    table = dataset.cube.counts("ym", dataset.cube.select(filters)).reset_index(name="Visitas")
+    table.insert(0, "Mes", month_labels(table.pop("ym")))
+    return table
+
+
+def centro_table(dataset, filters):
+    ranking = dataset.centro_ranking
+    top = ranking.top(filters, 0, ranking.size(filters))
+    table = top.rename_axis("Centro").reset_index(name="Visitas")
+    table.insert(0, "Puesto", np.arange(1, len(table) + 1))
+    return table
+
+
+def month_person_table(dataset, filters):
+    table = months_for(dataset, active_persons(filters), filters).reset_index()
+    table.insert(0, "Mes", month_labels(table.pop("ym")))
+    return table
+
+
+def year_person_table(dataset, filters):
+    table = years_for(dataset, active_persons(filters), filters).reset_index()
+    return table.rename(columns={"persona": "Consultora", **{y: str(y) for y in YEARS}})
+
+
+TAB_TABLES = {
+    "general": {
+        "Visitas por año": lambda d, f: _counts(d, f.without_dates(), "year", "Año"),
+        "Visitas por mes": monthly_table,
+        "Visitas por consultora": lambda d, f: _counts(d, f, "persona", "Consultora"),
+    },
+    "centros": {"Ranking de centros": centro_table},
+    "evolucion": {
+        "Visitas por mes y consultora": month_person_table,
+        "Visitas por año y consultora": year_person_table,
+    },
+    "duracion": {
+        "Duración de las visitas": lambda d, f: _counts(d, f, "duracion", "Duración"),
+        "Hora de inicio": lambda d, f: _counts(d, f, "hora", "Hora"),
+    },
+}
+
+
+# ── ESCRITURA ─────────────────────────────────────────────────────────────────
+def write_csv(chunks, f):
+    # Separador ";" y BOM: Excel en castellano lo abre directamente en columnas
+    f.write(b"\xef\xbb\xbf")
+    for i, chunk in enumerate(chunks):
+        f.write(chunk.to_csv(index=False, header=i == 0, sep=";").encode())
+
+
+def write_parquet(chunks, f):
+    # Un grupo de filas por tramo
+    writer = None
+    for chunk in chunks:
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if writer is None:
+            writer = pq.ParquetWriter(f, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+def export(chunks, fmt):
+    """Bytes del fichero ``fmt`` ("CSV" o "Parquet") con los tramos de ``chunks``.
+
+    Los tramos se escriben en un temporal en disco: en memoria solo está el
+    tramo en curso y, al final, el fichero que Streamlit sirve al navegador.
+    """
+    write = write_csv if fmt == "CSV" else write_parquet
+    with _slots, tempfile.TemporaryFile() as f:
+        write(chunks, f)
+        f.seek(0)
+        return f.read()
+
+
+def table_chunks(table):
+    """Una tabla pequeña como un único tramo, para pasarla por ``export``."""
+    yield table
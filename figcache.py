@@ -0,0 +1,145 @@
+"""Caché LRU de figuras Plotly ya serializadas, compartida por todo el proceso.
+
+Cada entrada es el JSON de una figura, con clave (versión de datos, gráfica,
+filtros, parámetros). Repetir una vista (p. ej. volver a un año o consultora
+anterior) se salta tanto la agregación como la construcción de la figura. La
+caché está limitada por número de entradas y por bytes.
+"""
+
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import plotly.io as pio
+from plotly.basedatatypes import BaseFigure
+
+import perf
+from config import FIGURE_CACHE_BYTES, FIGURE_CACHE_ENTRIES
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    entries: int
+    bytes: int
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class FigureCache:
+    def __init__(self, max_entries=FIGURE_CACHE_ENTRIES, max_bytes=FIGURE_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._building = {}
+        self._hits = self._misses = self._evictions = 0
+
+    def get_or_build(self, key, build):
+        """JSON de la figura para ``key``; ``build()`` solo se llama si falta.
+
+        ``build`` devuelve una ``go.Figure`` o ``None`` (nada que dibujar),
+        que también se guarda para no repetir la agregación.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self._hits += 1
+            else:
+                self._misses += 1
+                building = self._building.get(key)
+                if building is None:
+                    self._building[key] = threading.Event()
+        if entry is not None:
+            perf.annotate(cache="hit", bytes=entry[1])
+            return entry[0]
+
+        # La figura se construye fuera del cerrojo. Si otro hilo ya está
+        # construyendo la misma (p. ej. el precalentamiento, ver warmup.py),
+        # se espera a su resultado en vez de repetir el trabajo.
+        if building is not None:
+            perf.annotate(cache="wait")
+            with perf.span("wait"):
+                building.wait()
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            # No se guardó (falló o no cabía): se construye aquí, sin registrarla
+        else:
+            perf.annotate(cache="miss")
+
+        try:
+            with perf.span("build"):
+                fig = build()
+            with perf.span("serialize") as attrs:
+                spec = pio.to_json(fig, validate=False) if fig is not None else None
+                size = attrs["bytes"] = len(spec.encode()) if spec is not None else 0
+
+            with self._lock:
+                if key not in self._entries and size <= self.max_bytes:
+                    self._entries[key] = (spec, size)
+                    self._bytes += size
+                    self._evict()
+        finally:
+            if building is None:
+                with self._lock:
+                    self._building.pop(key).set()
+        return spec
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return CacheStats(hits=self._hits, misses=self._misses, evictions=self._evictions,
+                              entries=len(self._entries), bytes=self._bytes)
+
+
+def figure_key(dataset, build, filters, *args):
+    """Clave de una gráfica: versión de datos, función, filtros y parámetros."""
+    return (dataset.version, build.__name__, filters, *args)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_cache():
+    """La caché de figuras del proceso (la app y el precalentamiento)."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = FigureCache()
+        return _shared
+
+
+class SerializedFigure(BaseFigure):
+    """Figura ya serializada que ``st.plotly_chart`` acepta sin reconstruirla.
+
+    Streamlit trata cualquier ``BaseFigure`` como validada y solo llama a
+    ``to_dict()``; así se evita volver a crear y validar la ``go.Figure``.
+    No se llama a ``BaseFigure.__init__`` a propósito.
+    """
+
+    def __init__(self, spec):
+        self._spec = spec
+
+    def to_dict(self):
+        return json.loads(self._spec)
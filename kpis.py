@@ -0,0 +1,76 @@
+"""KPIs de la cabecera calculados por ventanas de meses.
+
+El total y los meses activos de cada ventana salen de las sumas acumuladas
+de ``dataset.PrefixCounts`` (dos restas por ventana), así que ni los KPIs
+habituales ni las medias móviles o la comparación interanual vuelven a
+recorrer las visitas.
+"""
+
+from dataclasses import dataclass, replace
+
+
+@dataclass(frozen=True)
+class Kpis:
+    total: int
+    media_mensual: int
+    media_3m: float | None
+    media_12m: float | None
+    yoy: float | None
+
+
+def date_windows(filters, ym0, ym1):
+    """Ventanas de meses disjuntas que cubren los filtros de año y rango."""
+    lo = ym0 if filters.ym_from is None else max(ym0, filters.ym_from)
+    hi = ym1 if filters.ym_to is None else min(ym1, filters.ym_to)
+    if not filters.years:
+        return [(lo, hi)] if lo <= hi else []
+    windows = []
+    for year in sorted(filters.years):
+        a, b = max(lo, year * 12), min(hi, year * 12 + 11)
+        if a <= b:
+            windows.append((a, b))
+    return windows
+
+
+def compute_kpis(dataset, filters):
+    """KPIs de la cabecera para los filtros activos.
+
+    Con consultora y centro filtrados a la vez las sumas acumuladas no bastan
+    (son por una sola dimensión) y se recurre al cubo.
+    """
+    prefix, cube = dataset.prefix, dataset.cube
+    if filters.personas and filters.centros:
+        def window(lo, hi):
+            sub = cube.select(replace(filters, years=(), ym_from=lo, ym_to=hi))
+            per_month = cube.counts("ym", sub)
+            return int(per_month.sum()), len(per_month)
+    elif filters.centros:
+        def window(lo, hi):
+            return prefix.window(lo, hi, "centro", filters.centros)
+    else:
+        def window(lo, hi):
+            return prefix.window(lo, hi, "persona", filters.personas)
+
+    windows = date_windows(filters, prefix.ym0, prefix.ym1)
+    stats = [window(lo, hi) for lo, hi in windows]
+    total = sum(v for v, _ in stats)
+    active = sum(a for _, a in stats)
+    media = round(total / active) if active > 0 else 0
+
+    media_3m = media_12m = yoy = None
+    if windows:
+        end = windows[-1][1]
+        media_3m = _trailing_mean(window, end, 3, prefix.ym0)
+        media_12m = _trailing_mean(window, end, 12, prefix.ym0)
+        # Misma ventana un año antes, solo si los datos la cubren entera
+        if windows[0][0] - 12 >= prefix.ym0:
+            previous = sum(window(lo - 12, hi - 12)[0] for lo, hi in windows)
+            if previous > 0:
+                yoy = total / previous - 1
+    return Kpis(total=total, media_mensual=media, media_3m=media_3m, media_12m=media_12m, yoy=yoy)
+
+
+def _trailing_mean(window, end, months, ym0):
+    start = max(end - months + 1, ym0)
+    return window(start, end)[0] / (end - start + 1)
+
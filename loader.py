@@ -0,0 +1,285 @@
+"""Lectura del Excel de visitas con caché columnar en disco.
+
+El parseo de ``visitas_FROCA.xlsx`` con openpyxl es el paso más lento de la
+app. La hoja se lee en streaming, por lotes de filas, y cada lote se
+normaliza y se vuelca en columnas compactas: la memoria no crece con el
+tamaño del libro más allá del resultado final. Tras normalizar los datos se
+guarda una instantánea Parquet junto al Excel, etiquetada con el tamaño,
+mtime y hash SHA-256 del libro. Mientras el Excel no cambie, la carga se
+sirve desde la instantánea.
+
+Cuando el Excel cambia, la instantánea guarda además un hash por bloque de
+filas del XML de la hoja (ver sheetscan.py): los bloques iniciales que no
+han cambiado se copian de la instantánea y solo se parsea el resto.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import operator
+import os
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import (DUR_ORDER, EXCEL_PATH, HORA_ORDER, INGEST_BATCH_ROWS, PERSONS, SHEET_NAME,
+                    USECOLS, YEARS)
+
+logger = logging.getLogger(__name__)
+
+# Subir este número cada vez que cambie la normalización: invalida las
+# instantáneas escritas por versiones anteriores.
+SNAPSHOT_VERSION = 4
+SNAPSHOT_META_KEY = b"froca_snapshot"
+_HASH_CHUNK = 1 << 20
+
+
+# ── HUELLA DEL LIBRO ──────────────────────────────────────────────────────────
+def snapshot_path(excel_path=EXCEL_PATH, sheet_name=SHEET_NAME):
+    # Una instantánea por hoja; la hoja por defecto conserva el nombre corto
+    suffix = ".snapshot.parquet" if sheet_name == SHEET_NAME else f".{sheet_name}.snapshot.parquet"
+    return Path(excel_path).with_suffix(suffix)
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def stat_fingerprint(path):
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+# ── LECTURA EN STREAMING ──────────────────────────────────────────────────────
+def read_workbook(excel_path=EXCEL_PATH, previous=None, batch_rows=INGEST_BATCH_ROWS,
+                  sheet_name=SHEET_NAME):
+    """Parsea la hoja ``sheet_name`` y devuelve ``(df, checkpoints)``.
+
+    Solo hay en memoria un lote de ``batch_rows`` filas crudas a la vez; las
+    filas descartadas (otra consultora, fuera de ``YEARS``) no llegan a
+    guardarse. ``checkpoints`` tiene, por cada lote completo, su hash y el
+    número de visitas acumuladas hasta él. Con ``previous = (df, checkpoints)``
+    de la carga anterior, los lotes iniciales sin cambios se copian de ``df``.
+    """
+    # openpyxl solo se importa si hay que parsear: con la instantánea vigente
+    # la app arranca sin cargarlo
+    import openpyxl
+
+    from sheetscan import SheetScan, parse_rows
+
+    prev_df, prev_checkpoints = previous or (None, [])
+    wb = openpyxl.load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        ws = wb[sheet_name]
+        scan = SheetScan(ws._shared_strings, _layout_seed(wb, ws), batch_rows, prev_checkpoints)
+        columns = VisitColumns(capacity=max((ws.max_row or 1) - 1, 1))
+        counts = []
+        with wb._archive.open(ws._worksheet_path) as src:
+            rows = parse_rows(wb, ws, scan.stream(src), max(USECOLS) + 1)
+            next(rows, None)  # fila de títulos
+            # Al entregar la fila de títulos el escaneo ya sabe cuántos lotes reutiliza
+            if scan.reused:
+                columns.append(prev_df.iloc[:prev_checkpoints[scan.reused - 1][3]])
+            pick = operator.itemgetter(*USECOLS)
+            while batch := list(itertools.islice(rows, batch_rows)):
+                columns.append(normalize(pd.DataFrame([pick(r) for r in batch])))
+                counts.append(columns.size)
+    finally:
+        wb.close()
+
+    checkpoints = prev_checkpoints[:scan.reused] + [
+        info + [n] for info, n in zip(scan.blocks[scan.reused:], counts)
+    ]
+    if prev_checkpoints:
+        logger.info("%s [%s]: %d de %d lotes reutilizados de la instantánea",
+                    excel_path, sheet_name, scan.reused, len(scan.blocks))
+    return columns.frame(), checkpoints
+
+
+def _layout_seed(wb, ws):
+    # Los estilos deciden qué números son fechas; si cambian, se relee todo
+    try:
+        styles = wb._archive.read("xl/styles.xml")
+    except KeyError:
+        styles = b""
+    return b"|".join([str(SNAPSHOT_VERSION).encode(), str(wb.epoch).encode(),
+                      ws._worksheet_path.encode(), styles])
+
+
+class VisitColumns:
+    """Columnas compactas preasignadas donde se acumulan los lotes normalizados.
+
+    Los códigos de centro de cada lote se traducen a un diccionario global;
+    al final las categorías se ordenan igual que en ``encode``.
+    """
+
+    DTYPES = {"marca": "datetime64[ns]", "persona": np.int8, "centro": np.int32,
+              "fecha": "datetime64[ns]", "hora": np.int8, "duracion": np.int8,
+              "year": np.int16, "ym": np.int32}
+
+    def __init__(self, capacity=INGEST_BATCH_ROWS):
+        self.size = 0
+        self.arrays = {c: np.empty(capacity, dtype) for c, dtype in self.DTYPES.items()}
+        self.centros = {}
+
+    def append(self, part):
+        n = len(part)
+        if self.size + n > len(self.arrays["ym"]):
+            capacity = max(self.size + n, 2 * len(self.arrays["ym"]))
+            for c, arr in self.arrays.items():
+                grown = np.empty(capacity, arr.dtype)
+                grown[:self.size] = arr[:self.size]
+                self.arrays[c] = grown
+
+        # Recodificar por valor: las categorías leídas de Parquet pueden venir en otro orden
+        fixed = {c: part[c].cat.set_categories(cats).cat.codes
+                 for c, cats in (("persona", PERSONS), ("hora", HORA_ORDER), ("duracion", DUR_ORDER))}
+        centro = part["centro"].cat
+        lookup = np.array([self.centros.setdefault(c, len(self.centros)) for c in centro.categories],
+                          dtype=np.int32)
+        values = {
+            "marca": part["marca"].to_numpy("datetime64[ns]"),
+            "persona": fixed["persona"],
+            "centro": lookup[centro.codes.to_numpy()],
+            "fecha": part["fecha"].to_numpy("datetime64[ns]"),
+            "hora": fixed["hora"],
+            "duracion": fixed["duracion"],
+            "year": part["year"],
+            "ym": part["ym"],
+        }
+        for c, v in values.items():
+            self.arrays[c][self.size:self.size + n] = v
+        self.size += n
+
+    def frame(self):
+        cols = {c: arr[:self.size] for c, arr in self.arrays.items()}
+        centros, order = pd.Index(list(self.centros), dtype=object).sort_values(return_indexer=True)
+        remap = np.empty(len(centros), np.int32)
+        remap[order] = np.arange(len(centros), dtype=np.int32)
+        return pd.DataFrame({
+            "marca": cols["marca"],
+            "persona": pd.Categorical.from_codes(cols["persona"], categories=PERSONS),
+            "centro": pd.Categorical.from_codes(remap[cols["centro"]], categories=centros),
+            "fecha": cols["fecha"],
+            "hora": pd.Categorical.from_codes(cols["hora"], categories=HORA_ORDER),
+            "duracion": pd.Categorical.from_codes(cols["duracion"], categories=DUR_ORDER),
+            "year": cols["year"],
+            "ym": cols["ym"],
+        })
+
+
+# ── NORMALIZACIÓN ─────────────────────────────────────────────────────────────
+
+
+def normalize(df):
+    """Esquema compacto: categóricas con categorías fijas y enteros pequeños.
+
+    ``ym`` es el mes como entero ``year * 12 + (mes - 1)``; las etiquetas
+    "Ene 24" se obtienen de una tabla (``dataset.month_labels``).
+    """
+    df.columns = ["marca","persona","centro","fecha","hora","duracion"]
+    df = df.dropna(subset=["fecha","persona","centro"])
+    fecha = pd.to_datetime(df["fecha"], errors="coerce")
+    persona = encode(df["persona"], PERSONS, upper=True)
+    keep = fecha.dt.year.isin(YEARS).to_numpy() & (persona.codes >= 0)
+    df, fecha, persona = df[keep], fecha[keep], persona[keep]
+    out = pd.DataFrame({
+        "marca": pd.to_datetime(df["marca"], errors="coerce"),
+        "persona": persona,
+        "centro": encode(df["centro"], upper=True),
+        "fecha": fecha,
+        "hora": encode(df["hora"], HORA_ORDER),
+        "duracion": encode(df["duracion"], DUR_ORDER),
+        "year": fecha.dt.year.astype("int16"),
+        "ym": (fecha.dt.year * 12 + fecha.dt.month - 1).astype("int32"),
+    })
+    return out.reset_index(drop=True)
+
+
+def encode(values, categories=None, upper=False):
+    """Convierte una columna de texto en Categorical normalizando solo los valores distintos.
+
+    Sin ``categories`` se usan los valores normalizados, ordenados. Los que no
+    están entre ``categories`` quedan como nulos.
+    """
+    codes, uniques = pd.factorize(values)
+    norm = pd.Index(uniques).astype(str).str.strip()
+    if upper:
+        norm = norm.str.upper()
+    if categories is None:
+        categories = norm.unique().sort_values()
+    # El -1 final recoge los nulos (código -1 de factorize)
+    lookup = np.append(pd.Index(categories).get_indexer(norm), -1)
+    return pd.Categorical.from_codes(lookup[codes], categories=categories)
+
+
+# ── INSTANTÁNEA PARQUET ───────────────────────────────────────────────────────
+def read_snapshot_meta(path):
+    try:
+        meta = pq.read_schema(path).metadata or {}
+        return json.loads(meta[SNAPSHOT_META_KEY])
+    except (OSError, KeyError, ValueError, pa.ArrowException):
+        return None
+
+
+def write_snapshot(df, path, fingerprint):
+    """Escritura atómica: fichero temporal + ``os.replace``."""
+    meta = dict(fingerprint, version=SNAPSHOT_VERSION)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), SNAPSHOT_META_KEY: json.dumps(meta).encode()}
+    )
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        pq.write_table(table, tmp)
+        os.replace(tmp, path)
+    except OSError as e:
+        # Sistema de ficheros de solo lectura, disco lleno...: la app sigue
+        # funcionando, solo se pierde la caché.
+        logger.warning("No se pudo escribir la instantánea %s: %s", path, e)
+        tmp.unlink(missing_ok=True)
+
+
+def fresh_snapshot(excel_path=EXCEL_PATH, sheet_name=SHEET_NAME):
+    """Metadatos de la instantánea si sigue vigente sin leer el Excel (mismo tamaño y mtime)."""
+    meta = read_snapshot_meta(snapshot_path(excel_path, sheet_name))
+    if meta is None or meta.get("version") != SNAPSHOT_VERSION:
+        return None
+    fingerprint = stat_fingerprint(excel_path)
+    return meta if all(meta.get(k) == v for k, v in fingerprint.items()) else None
+
+
+def load_visits(excel_path=EXCEL_PATH, sheet_name=SHEET_NAME):
+    """Devuelve las visitas normalizadas, desde la instantánea si sigue vigente.
+
+    Si tamaño y mtime coinciden con los guardados no se lee el Excel. Si no,
+    se calcula el hash: un libro idéntico con otra fecha (p. ej. tras un
+    ``git clone``) reutiliza la instantánea y solo se actualiza su huella.
+    Un libro distinto se lee de forma incremental a partir de la instantánea.
+    """
+    excel_path = Path(excel_path)
+    snap = snapshot_path(excel_path, sheet_name)
+    if fresh_snapshot(excel_path, sheet_name) is not None:
+        return pd.read_parquet(snap)
+
+    meta = read_snapshot_meta(snap)
+    if meta is not None and meta.get("version") != SNAPSHOT_VERSION:
+        meta = None
+    fingerprint = stat_fingerprint(excel_path)
+    fingerprint["sha256"] = file_hash(excel_path)
+    if meta is not None and meta.get("sha256") == fingerprint["sha256"]:
+        df = pd.read_parquet(snap)
+        checkpoints = meta.get("checkpoints", [])
+    else:
+        previous = (pd.read_parquet(snap), meta["checkpoints"]) if meta and meta.get("checkpoints") else None
+        df, checkpoints = read_workbook(excel_path, previous, sheet_name=sheet_name)
+    write_snapshot(df, snap, dict(fingerprint, checkpoints=checkpoints))
+    return df
@@ -0,0 +1,154 @@
+"""Tiempos por etapa de cada ejecución del script.
+
+Cada ejecución (la app completa o un fragmento que se relanza solo) abre una
+traza con ``begin``/``run``; dentro, ``span`` mide una etapa con nombre y
+admite atributos (bytes de la figura, acierto de caché...). Los tramos se
+anidan: ``app > centros_tab > chart:centro_chart > build > aggregate``. Al
+cerrar la traza se añade como una línea JSON a ``PERF_LOG``.
+
+Fuera de una traza ``span`` no mide nada, así que los módulos de datos y de
+gráficas pueden instrumentarse sin depender de Streamlit.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import PERF_LOG, PERF_LOG_MAX_BYTES
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar("perf_trace", default=None)
+_log_lock = threading.Lock()
+
+
+class Trace:
+    def __init__(self, name, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.started_at = datetime.now()
+        self.spans = []
+        self.total_ms = None
+        self._t0 = time.perf_counter()
+        self._stack = []
+        self._open = []
+
+    def to_dict(self):
+        return {"ts": self.started_at.isoformat(timespec="milliseconds"), "run": self.name,
+                **self.attrs, "total_ms": self.total_ms, "spans": self.spans}
+
+
+def current():
+    return _current.get()
+
+
+def begin(name, **attrs):
+    """Abre la traza de esta ejecución (descarta una anterior sin cerrar)."""
+    trace = Trace(name, **attrs)
+    _current.set(trace)
+    return trace
+
+
+def end(trace=None):
+    """Cierra la traza, la escribe en el log y la devuelve."""
+    trace = trace or _current.get()
+    if trace is None:
+        return None
+    trace.total_ms = round((time.perf_counter() - trace._t0) * 1000, 3)
+    if _current.get() is trace:
+        _current.set(None)
+    write_log(trace)
+    return trace
+
+
+@contextmanager
+def span(name, **attrs):
+    """Mide el bloque como etapa ``name`` de la traza actual.
+
+    Devuelve el diccionario de atributos para completarlo dentro del bloque.
+    """
+    trace = _current.get()
+    if trace is None:
+        yield attrs
+        return
+    path = "/".join([*trace._stack, name])
+    entry = {"name": path, "start_ms": round((time.perf_counter() - trace._t0) * 1000, 3)}
+    trace.spans.append(entry)
+    trace._stack.append(name)
+    trace._open.append(attrs)
+    t0 = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        entry["ms"] = round((time.perf_counter() - t0) * 1000, 3)
+        entry.update(attrs)
+        trace._stack.pop()
+        trace._open.pop()
+
+
+@contextmanager
+def run(name, **attrs):
+    """Etapa dentro de una traza abierta o, si no la hay, traza propia.
+
+    Para los fragmentos: en una ejecución completa son una etapa más; cuando
+    se relanzan solos, su ejecución queda registrada como traza aparte (con
+    ``attrs``).
+    """
+    if _current.get() is not None:
+        with span(name):
+            yield
+        return
+    trace = begin(name, **attrs)
+    try:
+        yield
+    finally:
+        end(trace)
+
+
+def annotate(**attrs):
+    """Añade atributos a la etapa abierta más interna (o a la traza si no hay ninguna)."""
+    trace = _current.get()
+    if trace is not None:
+        (trace._open[-1] if trace._open else trace.attrs).update(attrs)
+
+
+# ── LOG JSONL ─────────────────────────────────────────────────────────────────
+def write_log(trace, path=PERF_LOG):
+    if path is None:
+        return
+    line = json.dumps(trace.to_dict(), ensure_ascii=False, default=str) + "\n"
+    try:
+        with _log_lock:
+            if os.path.exists(path) and os.path.getsize(path) > PERF_LOG_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(line)
+    except OSError as e:
+        # Sin disco para el log la app sigue igual
+        logger.warning("No se pudo escribir %s: %s", path, e)
+
+
+def read_log(path=PERF_LOG, limit=50, tail_bytes=256 * 1024, **match):
+    """Últimas ``limit`` trazas del log cuyos atributos coinciden con ``match``."""
+    if path is None or not os.path.exists(path):
+        return []
+    with open(path, "rb") as f:
+        offset = max(0, os.path.getsize(path) - tail_bytes)
+        f.seek(offset)
+        lines = f.read().decode("utf-8", errors="replace").splitlines()
+    if offset:
+        lines = lines[1:]  # la primera puede estar cortada
+    traces = []
+    for line in lines:
+        try:
+            trace = json.loads(line)
+        except ValueError:
+            continue
+        if all(trace.get(k) == v for k, v in match.items()):
+            traces.append(trace)
+    return traces[-limit:]
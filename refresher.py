@@ -0,0 +1,148 @@
+"""Recarga en segundo plano del conjunto de datos (stale-while-revalidate).
+
+Un hilo vigila los libros del origen de datos y, cuando cambian, reconstruye los datos fuera del
+camino de las peticiones. Las sesiones siempre leen el último conjunto
+bueno; el cambio de versión es una simple asignación de referencia.
+"""
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from config import DATA_SOURCE, REFRESH_INTERVAL
+from dataset import build_dataset
+from sources import load_source, source_fingerprint
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RefreshStatus:
+    last_check: datetime | None = None
+    last_refresh: datetime | None = None
+    last_duration: float | None = None
+    last_error: str | None = None
+    last_error_at: datetime | None = None
+    refreshes: int = 0
+    failures: int = 0
+
+
+class DatasetRefresher:
+    def __init__(self, source=DATA_SOURCE, interval=REFRESH_INTERVAL, build=load_source):
+        self.source = source
+        self.interval = interval
+        self._build = build
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._current = None
+        self._fingerprint = None
+        self._listeners = []
+        self.status = RefreshStatus()
+
+    # ── API para las sesiones ─────────────────────────────────────────────────
+    def start(self):
+        """Carga inicial síncrona y arranque del hilo de vigilancia."""
+        if self._current is None:
+            self._refresh()
+            if self._current is None:
+                raise RuntimeError(self.status.last_error)
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="froca-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def get(self):
+        return self._current
+
+    def subscribe(self, listener):
+        """``listener(dataset)`` se llama en el hilo de recarga con cada conjunto nuevo."""
+        self._listeners.append(listener)
+
+    def request_refresh(self):
+        """Fuerza una comprobación inmediata sin esperar al intervalo."""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    # ── Hilo de fondo ─────────────────────────────────────────────────────────
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            self._check()
+
+    def _check(self):
+        self.status.last_check = datetime.now()
+        try:
+            fingerprint = source_fingerprint(self.source)
+        except OSError as e:
+            self._record_failure(e)
+            return
+        if fingerprint != self._fingerprint:
+            self._refresh()
+
+    def _refresh(self):
+        # Solo un hilo reconstruye a la vez; las lecturas nunca esperan.
+        with self._lock:
+            t0 = time.perf_counter()
+            try:
+                fingerprint = source_fingerprint(self.source)
+            except OSError as e:
+                self._record_failure(e)
+                return
+            try:
+                df = self._build(self.source)
+                version = self._current.version + 1 if self._current else 1
+                dataset = build_dataset(df, version)
+            except Exception as e:
+                # No se reintenta hasta que el Excel vuelva a cambiar
+                self._fingerprint = fingerprint
+                self._record_failure(e)
+                return
+            duration = time.perf_counter() - t0
+            self._current = dataset
+            self._fingerprint = fingerprint
+            st = self.status
+            st.last_refresh = self._current.loaded_at
+            st.last_duration = duration
+            st.refreshes += 1
+            logger.info("Datos recargados (v%d, %d filas) en %.2f s", version, len(df), duration)
+            for listener in self._listeners:
+                try:
+                    listener(dataset)
+                except Exception:
+                    logger.exception("Fallo en %r tras recargar los datos", listener)
+
+    def _record_failure(self, error):
+        # Se conserva el último conjunto bueno; el fallo queda en el estado.
+        st = self.status
+        st.last_error = f"{type(error).__name__}: {error}"
+        st.last_error_at = datetime.now()
+        st.failures += 1
+        logger.warning("Fallo recargando %s: %s", self.source, error)
+
+
+# ── REFRESCO COMPARTIDO ───────────────────────────────────────────────────────
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_refresher():
+    """El refresco único del proceso, arrancado la primera vez que se pide.
+
+    Lo comparten la app y el precalentamiento (ver warmup.py): quien llegue
+    mientras otro hace la carga inicial espera a que termine. Si la carga
+    falla, se vuelve a intentar en la siguiente llamada.
+    """
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = DatasetRefresher().start()
+        return _shared
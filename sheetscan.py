@@ -0,0 +1,170 @@
+"""Huellas por bloques del XML de una hoja, para releer solo lo que cambia.
+
+El libro se sustituye cada semana por otro que repite casi todo el histórico
+y añade las visitas nuevas al final. Parsear las celdas con openpyxl es lo
+caro; trocear el XML de la hoja en filas (``<row>...</row>``) y calcular un
+hash encadenado por bloque de filas es mucho más barato. Los bloques iniciales
+cuyo hash coincide con el de la carga anterior no se vuelven a parsear: sus
+visitas se toman de la instantánea y el parser solo recibe el resto.
+
+Un bloque solo se reutiliza si, además, las cadenas compartidas que
+referencian sus celdas son las mismas, y la cadena de hashes parte de los
+estilos del libro y de la fila de títulos: si cambian, se relee todo.
+"""
+
+import hashlib
+import io
+import re
+
+from openpyxl.worksheet._reader import WorkSheetParser
+
+_CHUNK = 1 << 20
+ROW_START = re.compile(rb"<(?:\w+:)?row\b")
+STRING_REF = re.compile(rb'<(?:\w+:)?c\b[^>]*?\bt="s"[^>]*>\s*<(?:\w+:)?v>(\d+)<')
+
+
+def split_rows(src):
+    """Trocea el XML en ``(False, cabecera)``, ``(True, fila)``... y ``(False, cola)``."""
+    buf = b""
+    head = None
+    for chunk in iter(lambda: src.read(_CHUNK), b""):
+        buf += chunk
+        pos = 0
+        while m := ROW_START.search(buf, pos):
+            # Fila vacía (<row .../>) o fila con celdas hasta su </row>
+            gt = buf.find(b">", m.end())
+            if gt < 0:
+                break
+            if buf[gt - 1] == ord("/"):
+                end = gt + 1
+            else:
+                close = b"</" + m.group()[1:] + b">"
+                end = buf.find(close, gt)
+                if end < 0:
+                    break
+                end += len(close)
+            if head is None:
+                head = buf[:m.start()]
+                yield False, head
+            yield True, buf[m.start():end]
+            pos = end
+        buf = buf[pos:]
+    if head is None:
+        yield False, b""
+    yield False, buf
+
+
+class SheetScan:
+    """Hash encadenado por bloques de ``block_rows`` filas de datos.
+
+    ``previous`` son los bloques de la carga anterior (``[hash, cadenas,
+    hash de cadenas, ...]``). ``stream()`` entrega al parser la cabecera, la
+    fila de títulos y las filas a partir del primer bloque distinto; los
+    bloques iguales se cuentan en ``reused`` y se descartan sin parsear.
+    """
+
+    def __init__(self, shared_strings, seed, block_rows, previous=()):
+        self.shared_strings = shared_strings
+        self.block_rows = block_rows
+        self.previous = previous
+        self.reused = 0
+        self.blocks = []
+        self._digest = hashlib.sha1(seed).digest()
+        self._strings = 0
+        self._strings_hash = hashlib.sha1()
+        self._hashed_strings = 0
+
+    def stream(self, src):
+        header = None
+        block = []
+        deciding = bool(self.previous)
+        tail = b""
+        for is_row, data in split_rows(src):
+            if not is_row:
+                if header is None:
+                    yield data
+                else:
+                    tail = data
+                continue
+            if header is None:
+                header = data
+                self._digest = hashlib.sha1(self._digest + data).digest()
+                if not deciding:
+                    yield header
+                continue
+            block.append(data)
+            if not deciding:
+                yield data
+            if len(block) == self.block_rows:
+                info = self._close_block(block)
+                if deciding:
+                    i = len(self.blocks) - 1
+                    if i < len(self.previous) and self.previous[i][:3] == info:
+                        self.reused += 1
+                        block = []
+                        continue
+                    deciding = False
+                    yield header
+                    yield from block
+                block = []
+        if deciding and header is not None:
+            yield header
+            yield from block
+        yield tail
+
+    def _close_block(self, block):
+        h = hashlib.sha1(self._digest)
+        for row in block:
+            h.update(row)
+            refs = STRING_REF.findall(row)
+            if refs:
+                self._strings = max(self._strings, max(map(int, refs)) + 1)
+        self._digest = h.digest()
+
+        for s in self.shared_strings[self._hashed_strings:self._strings]:
+            self._strings_hash.update(str(s).encode() + b"\0")
+        self._hashed_strings = self._strings
+
+        info = [self._digest.hex(), self._strings, self._strings_hash.hexdigest()]
+        self.blocks.append(info)
+        return info
+
+
+class _IterReader(io.RawIOBase):
+    """Fichero de solo lectura sobre un iterador de bytes."""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            self._buf = next(self._chunks, None)
+            if self._buf is None:
+                self._buf = b""
+                return 0
+        n = min(len(b), len(self._buf))
+        b[:n] = self._buf[:n]
+        self._buf = self._buf[n:]
+        return n
+
+
+def parse_rows(wb, ws, chunks, ncols):
+    """Valores de las ``ncols`` primeras columnas de cada fila del XML en ``chunks``.
+
+    Usa el mismo parser que la hoja read-only ``ws`` de openpyxl (fechas,
+    estilos y cadenas compartidas del libro ``wb``), pero sobre un flujo de
+    bytes.
+    """
+    parser = WorkSheetParser(io.BufferedReader(_IterReader(chunks)), ws._shared_strings,
+                             data_only=True, epoch=wb.epoch, date_formats=wb._date_formats,
+                             timedelta_formats=wb._timedelta_formats)
+    for _, cells in parser.parse():
+        values = [None] * ncols
+        for cell in cells:
+            if cell["column"] <= ncols:
+                values[cell["column"] - 1] = cell["value"]
+        yield values
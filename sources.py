@@ -0,0 +1,82 @@
+"""Origen de los datos: uno o varios libros, una o varias hojas por libro.
+
+``DATA_SOURCE`` puede ser un libro, una carpeta o un patrón glob; de cada
+libro se leen las hojas que encajan con ``SHEETS``. Cada par (libro, hoja)
+se carga con ``loader.load_visits`` —con su propia instantánea y lectura
+incremental— y los pares se reparten entre varios procesos, porque el
+parseo con openpyxl es puro Python y no se beneficia de hilos. Los
+resultados se unen con la misma normalización que un libro único.
+"""
+
+import glob
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from pathlib import Path
+from xml.etree import ElementTree
+
+from config import DATA_SOURCE, LOAD_WORKERS, SHEETS
+from loader import VisitColumns, fresh_snapshot, load_visits, stat_fingerprint
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def resolve_workbooks(source=DATA_SOURCE):
+    """Libros ``.xlsx`` del origen, ordenados por ruta."""
+    path = Path(source)
+    if path.is_dir():
+        paths = path.glob("*.xlsx")
+    elif glob.has_magic(str(source)):
+        paths = map(Path, glob.glob(str(source)))
+    else:
+        return [path]
+    # Excel deja ficheros de bloqueo "~$libro.xlsx" mientras está abierto
+    return sorted(p for p in paths if not p.name.startswith("~$"))
+
+
+def sheet_names(excel_path):
+    """Nombres de las hojas del libro, leídos de ``xl/workbook.xml`` sin abrir las hojas."""
+    with zipfile.ZipFile(excel_path) as zf:
+        root = ElementTree.fromstring(zf.read("xl/workbook.xml"))
+    return [sheet.get("name") for sheet in root.iter(f"{_MAIN_NS}sheet")]
+
+
+def list_parts(source=DATA_SOURCE, sheets=SHEETS):
+    """Pares (libro, hoja) que hay que cargar."""
+    parts = []
+    for path in resolve_workbooks(source):
+        parts += [(path, name) for name in sheet_names(path)
+                  if any(fnmatch(name, pattern) for pattern in sheets)]
+    if not parts:
+        raise ValueError(f"No hay hojas {sheets} en {source}")
+    return parts
+
+
+def source_fingerprint(source=DATA_SOURCE):
+    """Tamaño y mtime de cada libro: cambia al modificar, añadir o quitar uno."""
+    return {str(path): stat_fingerprint(path) for path in resolve_workbooks(source)}
+
+
+def load_source(source=DATA_SOURCE, sheets=SHEETS, workers=LOAD_WORKERS):
+    """Visitas normalizadas de todo el origen, en el orden de ``list_parts``."""
+    parts = list_parts(source, sheets)
+    # Solo se reparten los libros que hay que parsear; leer una instantánea
+    # vigente cuesta menos que arrancar un proceso.
+    stale = [part for part in parts if fresh_snapshot(*part) is None]
+    loaded = {}
+    workers = min(workers or os.cpu_count() or 1, len(stale))
+    if workers > 1:
+        # "spawn": se llama desde el hilo de recarga de un servidor con más
+        # hilos, y hacer fork en ese estado puede dejar cerrojos bloqueados.
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            loaded = dict(zip(stale, pool.map(load_visits, *zip(*stale))))
+    frames = [loaded[part] if part in loaded else load_visits(*part) for part in parts]
+    if len(frames) == 1:
+        return frames[0]
+    columns = VisitColumns(capacity=sum(map(len, frames)))
+    for frame in frames:
+        columns.append(frame)
+    return columns.frame()
@@ -0,0 +1,82 @@
+"""Precalentamiento: datos y vista inicial listos antes de que se pidan.
+
+Después de dormirse en Streamlit Cloud, el primer visitante pagaba la carga
+de los datos, la primera figura de Plotly (que carga sus validadores, unos
+cientos de ms) y todas las gráficas de la pestaña "general". ``start()``
+lanza un hilo que carga los datos con el refresco compartido (ver
+refresher.py) y deja en la caché de figuras las gráficas de la vista por
+defecto, mientras la primera ejecución de la app importa y pinta la
+cabecera. Tras cada recarga de datos se repite con la versión nueva, para
+que el primer visitante después de una actualización tampoco espere.
+"""
+
+import logging
+import threading
+import time
+
+import charts
+from config import FIRST_PAINT_BUDGET_MS, MAX_TIME_POINTS, MAX_TIME_POINTS_MOBILE
+from dataset import Filters
+from figcache import figure_key, shared_cache
+from refresher import shared_refresher
+
+logger = logging.getLogger(__name__)
+
+# Gráficas de la vista inicial (pestaña "general" sin filtros) con sus
+# parámetros, tal como las pide app.py en escritorio y en el móvil
+DEFAULT_VIEW = [
+    (charts.year_chart, ()),
+    (charts.monthly_chart, (MAX_TIME_POINTS,)),
+    (charts.monthly_chart, (MAX_TIME_POINTS_MOBILE,)),
+    (charts.person_chart, ()),
+]
+
+_lock = threading.Lock()
+_boot = None
+
+
+def start():
+    """Lanza el precalentamiento una vez por proceso (las siguientes llamadas no hacen nada)."""
+    global _boot
+    with _lock:
+        if _boot is not None:
+            return
+        _boot = time.perf_counter()
+    threading.Thread(target=_run, name="froca-warmup", daemon=True).start()
+
+
+def _run():
+    t0 = time.perf_counter()
+    # Los validadores de Plotly se cargan con la primera figura: mientras
+    # se leen los datos
+    charts.go.Figure(charts.go.Bar())
+    try:
+        refresher = shared_refresher()
+    except Exception as e:
+        # La app mostrará el error al pedir los datos
+        logger.warning("Precalentamiento sin datos: %s", e)
+        return
+    refresher.subscribe(warm)
+    warm(refresher.get())
+    logger.info("Precalentamiento terminado en %.2f s", time.perf_counter() - t0)
+
+
+def warm(dataset):
+    """Construye las gráficas de ``DEFAULT_VIEW`` para ``dataset`` en la caché compartida."""
+    cache = shared_cache()
+    filters = Filters()
+    for build, args in DEFAULT_VIEW:
+        cache.get_or_build(figure_key(dataset, build, filters, *args),
+                           lambda: build(dataset, filters, *args))
+
+
+def report_first_paint(ms):
+    """Registra la primera pintura de una sesión y avisa si pasa del presupuesto.
+
+    Devuelve también los ms desde el arranque del precalentamiento, que en la
+    primera sesión tras despertar es casi todo lo que ha esperado el visitante.
+    """
+    since_boot = round((time.perf_counter() - _boot) * 1000, 3) if _boot is not None else None
+    if ms > FIRST_PAINT_BUDGET_MS:
+        logger.warning("Primera pintura en %.0f ms (presupuesto %d ms)", ms, FIRST_PAINT_BUDGET_MS)
+    return since_boot